@@ -0,0 +1 @@
+""" Offline harnesses and benchmarks for the Torro download engine. """
@@ -0,0 +1,179 @@
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK_SIZE = 64 * 1024
+
+WATCH_PAGE_PATH = re.compile(r'/watch/([\w-]+)$')
+MEDIA_PATH = re.compile(r'/media/([\w-]+)\.mp4$')
+
+# Just enough HTML for yt-dlp's generic extractor: a title and an HTML5 <video>.
+WATCH_PAGE = """<!DOCTYPE html>
+<html><head>
+<title>{title}</title>
+<meta property="og:title" content="{title}">
+</head><body>
+<video controls width="1280" height="720"><source src="/media/{name}.mp4" type="video/mp4"></video>
+</body></html>
+"""
+
+class FakeHost:
+    """ Local HTTP server that serves synthetic media files.
+
+    ``path`` serves the payload directly. Every ``/watch/<name>`` URL is a
+    small HTML page that yt-dlp's generic extractor resolves to
+    ``/media/<name>.mp4``, which serves the same payload, so any number of
+    distinct "videos" can be downloaded through the normal extraction path.
+
+    Supports HEAD, byte ranges, a per-connection bandwidth cap and an
+    optional cap shared by all connections, and logs every media request
+    with the byte range asked for and the number of bytes actually written,
+    so harnesses can check exactly what went over the wire.
+    """
+    def __init__(self, size=8 * 1024 * 1024, rate=None, latency=0.0, path='/video.mp4', seed=0,
+                 link_rate=None):
+        self.size = size
+        self.rate = rate          # bytes per second per connection, None for unthrottled
+        self.link_rate = link_rate  # bytes per second across all connections, None for unthrottled
+        self.latency = latency    # seconds before the first byte of each response
+        self.path = path
+        self.payload = random.Random(seed).randbytes(size)
+        self.requests = []        # dicts with method, range_start, bytes_sent
+        self._lock = threading.Lock()
+        self._link_free_at = 0.0  # monotonic time the shared link is idle again
+        self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def url(self):
+        return self.base_url + self.path
+
+    def page_url(self, name):
+        """ URL of a watch page for the video ``name`` (letters, digits, '_' and '-'). """
+        return f"{self.base_url}/watch/{name}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def bytes_sent(self, since=0):
+        """ Total body bytes written for requests logged from index ``since`` on. """
+        with self._lock:
+            return sum(entry['bytes_sent'] for entry in self.requests[since:])
+
+    def _log(self, entry):
+        with self._lock:
+            self.requests.append(entry)
+
+    def _reserve_link(self, count):
+        """ Seconds to wait before ``count`` more bytes fit under the shared link cap. """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._link_free_at)
+            self._link_free_at = start + count / self.link_rate
+            return self._link_free_at - now
+
+    def _handler_class(self):
+        host = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._respond(send_body=False)
+
+            def do_GET(self):
+                self._respond(send_body=True)
+
+            def _respond(self, send_body):
+                path = self.path.split('?')[0]
+                page = WATCH_PAGE_PATH.match(path)
+                if page:
+                    self._send_page(page.group(1), send_body)
+                    return
+                if path != host.path and not MEDIA_PATH.match(path):
+                    self.send_error(404)
+                    return
+                start, end = 0, host.size - 1
+                match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+                if match and match.group(1):
+                    start = int(match.group(1))
+                    if match.group(2):
+                        end = min(int(match.group(2)), host.size - 1)
+                if start >= host.size:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f"bytes */{host.size}")
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                if host.latency:
+                    time.sleep(host.latency)
+                self.send_response(206 if match else 200)
+                self.send_header('Content-Type', 'video/mp4')
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Length', str(end - start + 1))
+                if match:
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{host.size}")
+                self.end_headers()
+
+                entry = {'method': self.command, 'range_start': start if match else None, 'bytes_sent': 0}
+                host._log(entry)
+                if send_body:
+                    self._send_body(entry, start, end + 1)
+
+            def _send_page(self, name, send_body):
+                body = WATCH_PAGE.format(name=name, title=f"Fake video {name}").encode('utf-8')
+                if host.latency:
+                    time.sleep(host.latency)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+
+            def _send_body(self, entry, start, stop):
+                began = time.monotonic()
+                position = start
+                try:
+                    while position < stop:
+                        chunk = host.payload[position:min(position + CHUNK_SIZE, stop)]
+                        self.wfile.write(chunk)
+                        position += len(chunk)
+                        entry['bytes_sent'] += len(chunk)
+                        if host.rate:
+                            # Sleep until this connection is back under its bandwidth cap
+                            ahead = (position - start) / host.rate - (time.monotonic() - began)
+                            if ahead > 0:
+                                time.sleep(ahead)
+                        if host.link_rate:
+                            time.sleep(host._reserve_link(len(chunk)))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
@@ -0,0 +1,96 @@
+""" Kill-and-resume harness for journaled downloads.
+
+Serves a synthetic file from a throttled local FakeHost, starts a download
+with ``python -m torro get`` in a child process, SIGKILLs it halfway
+through, then runs ``python -m torro get`` again with no URLs, so the
+engine has to find the job in its own history and journal, and checks that:
+
+- the journal still knew the interrupted job after the kill,
+- the resumed transfer asked for a byte range starting at the .part size,
+- the server sent only the remaining bytes on the resume, and
+- the finished file is byte-for-byte identical to what was served.
+
+Usage: python -m benchmarks.resume_check [--size-mb 16] [--rate-mb 4]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fakehost import FakeHost
+from torro.engine import JOURNAL_NAME
+from torro.journal import JobJournal
+
+JOB_ID = '1'  # First row of a fresh history database
+
+def spawn(workdir, *urls):
+    """ Runs the real engine headless; with no URLs it only resumes unfinished jobs. """
+    return subprocess.Popen([sys.executable, '-m', 'torro', '--data-dir', os.path.join(workdir, 'data'),
+                             '--output', workdir, 'get', *urls])
+
+def part_files(workdir):
+    return [os.path.join(workdir, name) for name in os.listdir(workdir) if name.endswith('.part')]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=16)
+    parser.add_argument('--rate-mb', type=float, default=4, help="server bandwidth cap in MB/s")
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    failures = []
+    with FakeHost(size=size, rate=int(args.rate_mb * 1024 * 1024)) as host, \
+            tempfile.TemporaryDirectory() as workdir:
+        # First attempt: kill it once the .part file is about half full.
+        child = spawn(workdir, host.url)
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline and child.poll() is None:
+            parts = part_files(workdir)
+            if parts and os.path.getsize(parts[0]) >= size // 2:
+                break
+            time.sleep(0.05)
+        child.kill()
+        child.wait()
+
+        parts = part_files(workdir)
+        if not parts:
+            print("FAIL: no .part file left behind by the killed download")
+            return 1
+        part_size = os.path.getsize(parts[0])
+        journaled = JobJournal(os.path.join(workdir, 'data', JOURNAL_NAME)).get(JOB_ID)
+        if not journaled:
+            failures.append("journal lost the interrupted job")
+        print(f"killed at {part_size} / {size} bytes, journal offset "
+              f"{journaled['offset'] if journaled else 'missing'}")
+
+        # Second attempt: resume from the journal and the .part file.
+        first_resume_request = len(host.requests)
+        if spawn(workdir).wait() != 0:
+            failures.append("resumed download exited with an error")
+        resumed = [entry for entry in host.requests[first_resume_request:] if entry['range_start']]
+        resent = sum(entry['bytes_sent'] for entry in resumed)
+        print(f"resume requested range from {resumed[0]['range_start'] if resumed else 'n/a'}, "
+              f"server sent {resent} bytes (expected {size - part_size})")
+        if not resumed or resumed[0]['range_start'] != part_size:
+            failures.append("resume did not start at the .part size")
+        if resent != size - part_size:
+            failures.append("resume re-sent bytes that were already on disk")
+
+        finished = [name for name in os.listdir(workdir) if name.endswith('.mp4')]
+        if not finished:
+            failures.append("no finished file after resume")
+        else:
+            with open(os.path.join(workdir, finished[0]), 'rb') as f:
+                if f.read() != host.payload:
+                    failures.append("finished file does not match the served payload")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: resume transferred only the remaining bytes")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,393 @@
+""" Offline benchmark suite for the Torro engine, with regression checks.
+
+Every scenario runs in its own child process, so ``peak_rss_mb`` is the
+high-water mark of that scenario alone. The FakeHost stays in the parent,
+so its payload and server threads count against neither the RSS nor the
+GIL of the engine under test. Scenarios:
+
+- jobs_1 / jobs_10 / jobs_100: queue N watch pages from the FakeHost and
+  run them through the real Engine, extraction and all, over a link with
+  per-connection and shared bandwidth caps. The FakeHost is a single host,
+  so the scenario's ``workers`` sets both the worker count and the per-host
+  cap; results report it. Needs yt-dlp; skipped without it.
+- hook_storm: worker threads hammer DownloadManager.progress_hook while
+  the owner loop ticks at 60 Hz, the way the app's Clock does.
+- history_10k: 10,000 finished rows in the history database, paged into
+  the Downloads list the way scrolling to the bottom does.
+- rows_10k: memory of 10,000 rows as loaded from the history, and the
+  cost of applying them to recycled cards (torro.store.apply_row): a
+  scroll through all of them, progress ticks on the visible ones, and
+  re-layouts that change nothing. Cards are Kivy EventDispatchers with
+  DownloadCard's properties when Kivy is installed, plain objects
+  otherwise, so only compare results from the same environment.
+
+``frame_*`` numbers are owner-thread tick durations: the time the UI
+thread would spend in engine code per frame, excluding Kivy's own drawing.
+
+Usage:
+    python -m benchmarks.suite [--scenarios ...] [--save results.json]
+    python -m benchmarks.suite --baseline results.json   # exit 1 on regression
+"""
+import argparse
+import json
+import os
+import platform
+import queue
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from benchmarks.fakehost import FakeHost
+
+FRAME_SECONDS = 1 / 60
+JOB_TIMEOUT = 600  # seconds before a jobs scenario gives up
+
+SCENARIOS = {
+    'jobs_1': {'kind': 'jobs', 'jobs': 1, 'size_mb': 16, 'workers': 1},
+    'jobs_10': {'kind': 'jobs', 'jobs': 10, 'size_mb': 4, 'workers': 10},
+    'jobs_100': {'kind': 'jobs', 'jobs': 100, 'size_mb': 1, 'workers': 100},
+    'hook_storm': {'kind': 'hooks', 'jobs': 50, 'threads': 8, 'calls': 40000},
+    'history_10k': {'kind': 'history', 'rows': 10000},
+    'rows_10k': {'kind': 'rows', 'rows': 10000, 'cards': 12, 'ticks': 100},
+}
+
+# FakeHost link used by the jobs scenarios: a fast but not unlimited connection
+LINK = {'rate': 8 * 1024 * 1024, 'link_rate': 32 * 1024 * 1024, 'latency': 0.03}
+
+# metric -> (better direction, relative tolerance, absolute slack)
+# A result regresses only if it is worse than the baseline by more than both.
+REGRESSION_RULES = {
+    'throughput_mb_s': ('higher', 0.10, 0.5),
+    'hook_calls_per_s': ('higher', 0.20, 0),
+    'frame_p95_ms': ('lower', 0.25, 1.0),
+    'frame_max_ms': ('lower', 0.50, 5.0),
+    'page_p95_ms': ('lower', 0.25, 1.0),
+    'peak_rss_mb': ('lower', 0.10, 5.0),
+    'row_mb_per_10k': ('lower', 0.10, 0.2),
+    'recycle_ms_per_10k': ('lower', 0.25, 2.0),
+}
+
+class OwnerLoop:
+    """ Stands in for the app's main thread: runs call_soon callbacks and
+    applies buffered progress once per frame, timing each frame. """
+    def __init__(self):
+        self.calls = queue.Queue()
+        self.frames = []  # seconds spent per tick
+
+    def call_soon(self, fn, *args):
+        self.calls.put((fn, args))
+
+    def tick(self, engine):
+        started = time.perf_counter()
+        while True:
+            try:
+                fn, args = self.calls.get_nowait()
+            except queue.Empty:
+                break
+            fn(*args)
+        engine.apply_progress()
+        self.frames.append(time.perf_counter() - started)
+
+    def run(self, engine, done, timeout):
+        deadline = time.monotonic() + timeout
+        while not done() and time.monotonic() < deadline:
+            next_frame = time.monotonic() + FRAME_SECONDS
+            self.tick(engine)
+            time.sleep(max(0, next_frame - time.monotonic()))
+        self.tick(engine)
+        return done()
+
+def frame_stats(frames):
+    ordered = sorted(frames) or [0]
+    return {'frame_p50_ms': round(ordered[len(ordered) // 2] * 1000, 3),
+            'frame_p95_ms': round(ordered[int(len(ordered) * 0.95)] * 1000, 3),
+            'frame_max_ms': round(ordered[-1] * 1000, 3),
+            'frames': len(frames)}
+
+# --- Scenarios (run in the child process) ---
+def run_jobs(config, workdir, urls):
+    from torro.engine import Engine
+    from torro.manager import YT_DLP_AVAILABLE
+    if not YT_DLP_AVAILABLE:
+        return {'status': 'skipped', 'reason': 'yt-dlp is not installed'}
+
+    loop = OwnerLoop()
+    # Every FakeHost URL is on one host, so its cap must not be lower than the workers
+    engine = Engine(os.path.join(workdir, 'data'), loop.call_soon,
+                    download_folder=os.path.join(workdir, 'out'),
+                    max_workers=config['workers'], max_per_host=config['workers'])
+    statuses = {}
+    engine.bus.subscribe(lambda event, download_id, status, message: statuses.__setitem__(download_id, status),
+                         'status')
+    started = time.perf_counter()
+    engine.add_downloads('\n'.join(urls))
+    finished = loop.run(engine, lambda: engine.pending_count() == 0, JOB_TIMEOUT)
+    elapsed = time.perf_counter() - started
+
+    completed = sum(1 for status in statuses.values() if status == 'completed')
+    downloaded = sum(os.path.getsize(os.path.join(workdir, 'out', name))
+                     for name in os.listdir(os.path.join(workdir, 'out')) if name.endswith('.mp4'))
+    snapshot = {s['name']: s for s in engine.metrics.snapshot()['summaries']}
+    engine.close()
+    result = {'status': 'ok' if finished and completed == len(urls) else 'failed',
+              'seconds': round(elapsed, 3), 'completed': completed, 'workers': config['workers'],
+              'throughput_mb_s': round(downloaded / elapsed / 1024 / 1024, 3)}
+    for name in ('job_extract_seconds', 'job_ttfb_seconds'):
+        if name in snapshot:
+            result[name.replace('_seconds', '_p50_ms')] = round(snapshot[name]['p50'] * 1000, 3)
+    result.update(frame_stats(loop.frames))
+    return result
+
+def run_hooks(config, workdir, urls):
+    from torro.engine import Engine
+
+    loop = OwnerLoop()
+    # No workers: the jobs stay queued, only their progress hooks fire
+    engine = Engine(os.path.join(workdir, 'data'), loop.call_soon,
+                    download_folder=os.path.join(workdir, 'out'), max_workers=0)
+    ids = [engine.add_download(f"http://127.0.0.1/watch/{i}")['id'] for i in range(config['jobs'])]
+    hook = engine.manager.progress_hook
+    total = 100 * 1024 * 1024
+
+    def storm(offset):
+        for i in range(config['calls']):
+            downloaded = (i + 1) * total // config['calls']
+            hook(ids[(offset + i) % len(ids)], {'status': 'downloading', 'downloaded_bytes': downloaded,
+                                                 'total_bytes': total, 'speed': 4.2 * 1024 * 1024})
+
+    threads = [threading.Thread(target=storm, args=(n,)) for n in range(config['threads'])]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    loop.run(engine, lambda: not any(thread.is_alive() for thread in threads), JOB_TIMEOUT)
+    elapsed = time.perf_counter() - started
+    engine.close()
+    calls = config['threads'] * config['calls']
+    result = {'status': 'ok', 'seconds': round(elapsed, 3), 'hook_calls': calls,
+              'hook_calls_per_s': round(calls / elapsed)}
+    result.update(frame_stats(loop.frames))
+    return result
+
+def fill_history(data_dir, count):
+    from torro.history import HistoryDB
+
+    os.makedirs(data_dir)
+    history = HistoryDB(os.path.join(data_dir, 'history.db'))
+    for i in range(count):
+        history.insert({'url': f"https://example.com/watch?v={i:011d}", 'title': f"Video number {i}",
+                        'status': 'completed', 'progress': 100, 'speed': '✅'})
+    return history
+
+def run_history(config, workdir, urls):
+    from torro.engine import Engine
+    from torro.store import HistoryView
+
+    data_dir = os.path.join(workdir, 'data')
+    fill_history(data_dir, config['rows']).close()
+
+    loop = OwnerLoop()
+    started = time.perf_counter()
+    engine = Engine(data_dir, loop.call_soon, download_folder=os.path.join(workdir, 'out'))
+    view = HistoryView(engine.store)
+    engine.start()
+    start_ms = (time.perf_counter() - started) * 1000
+
+    # Each page is what one scroll-to-bottom costs the UI thread
+    pages = []
+    while not view.exhausted:
+        page_started = time.perf_counter()
+        if not view.load_more():
+            break
+        pages.append(time.perf_counter() - page_started)
+    rows = len(view.rows)
+    engine.close()
+    ordered = sorted(pages) or [0]
+    return {'status': 'ok' if rows == config['rows'] else 'failed', 'rows': rows,
+            'start_ms': round(start_ms, 3), 'pages': len(pages),
+            'page_p50_ms': round(ordered[len(ordered) // 2] * 1000, 3),
+            'page_p95_ms': round(ordered[int(len(ordered) * 0.95)] * 1000, 3),
+            'page_max_ms': round(ordered[-1] * 1000, 3)}
+
+def card_class():
+    """ Stand-in for DownloadCard, whose module needs a window: the same row fields. """
+    try:
+        from kivy.event import EventDispatcher
+        from kivy.properties import NumericProperty, StringProperty
+    except ImportError:
+        class PlainCard:
+            id = title = status = thumbnail = speed = ''
+            progress = 0
+            row = None
+            row_version = -1
+        return PlainCard
+
+    class KivyCard(EventDispatcher):
+        id = StringProperty('')
+        title = StringProperty('')
+        status = StringProperty('')
+        progress = NumericProperty(0)
+        thumbnail = StringProperty('')
+        speed = StringProperty('')
+        row = None
+        row_version = -1
+    return KivyCard
+
+def run_rows(config, workdir, urls):
+    from torro.store import apply_row
+
+    history = fill_history(os.path.join(workdir, 'data'), config['rows'])
+    def load(convert):
+        rows = []
+        page = history.page(None, 500)
+        while page:
+            rows.extend(map(convert, page))
+            page = history.page(rows[-1]['id'], 500)
+        return rows
+
+    tracemalloc.start()
+    rows = load(lambda row: row)
+    row_bytes = tracemalloc.get_traced_memory()[0]
+    # The same history loaded as plain dicts, the way rows used to be held
+    dicts = load(lambda row: dict(row.items()))
+    dict_bytes = tracemalloc.get_traced_memory()[0] - row_bytes
+    tracemalloc.stop()
+    del dicts
+    history.close()
+
+    Card = card_class()
+    cards = [Card() for _ in range(config['cards'])]
+    per_10k = 10000 / len(rows)
+
+    # Scrolling: every row lands on a recycled card showing another row
+    started = time.perf_counter()
+    for index, row in enumerate(rows):
+        apply_row(cards[index % len(cards)], row)
+    recycle = time.perf_counter() - started
+
+    # Progress ticks on the visible rows, each re-applied to its card
+    visible = list(zip(cards, rows[-len(cards):]))
+    applied = 0
+    started = time.perf_counter()
+    for tick in range(config['ticks']):
+        for card, row in visible:
+            row.update(progress=tick, speed=f"{tick / 10:.2f} MB/s")
+            applied += apply_row(card, row)
+    ticks = time.perf_counter() - started
+
+    # Re-layouts: the same rows again, unchanged
+    started = time.perf_counter()
+    for tick in range(config['ticks']):
+        for card, row in visible:
+            apply_row(card, row)
+    relayout = time.perf_counter() - started
+
+    refreshes = config['ticks'] * len(visible)
+    return {'status': 'ok', 'rows': len(rows), 'card': Card.__name__,
+            'row_mb_per_10k': round(row_bytes * per_10k / 1024 / 1024, 3),
+            'dict_row_mb_per_10k': round(dict_bytes * per_10k / 1024 / 1024, 3),
+            'recycle_ms_per_10k': round(recycle * per_10k * 1000, 3),
+            'tick_us_per_refresh': round(ticks / refreshes * 1e6, 3),
+            'tick_fields_per_refresh': round(applied / refreshes, 2),
+            'relayout_us_per_refresh': round(relayout / refreshes * 1e6, 3)}
+
+RUNNERS = {'jobs': run_jobs, 'hooks': run_hooks, 'history': run_history, 'rows': run_rows}
+
+def peak_rss_mb():
+    """ This process's peak resident set size.
+
+    VmHWM restarts at exec, unlike ru_maxrss, which Linux carries over from
+    the parent and would report the parent's peak if that was higher.
+    """
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def child_main(name, urls):
+    config = SCENARIOS[name]
+    with tempfile.TemporaryDirectory() as workdir:
+        result = RUNNERS[config['kind']](config, workdir, urls)
+    result['peak_rss_mb'] = peak_rss_mb()
+    print(json.dumps(result))
+    return 0
+
+# --- Parent: hosts, child processes, results ---
+def run_scenario(name):
+    config = SCENARIOS[name]
+    command = [sys.executable, '-m', 'benchmarks.suite', '--child', name]
+    host = None
+    if config['kind'] == 'jobs':
+        host = FakeHost(size=int(config['size_mb'] * 1024 * 1024), **LINK).__enter__()
+        command += [host.page_url(f"{name}-{i}") for i in range(config['jobs'])]
+    try:
+        child = subprocess.run(command, capture_output=True, text=True)
+    finally:
+        if host:
+            host.stop()
+    try:
+        return json.loads(child.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {'status': 'failed', 'reason': (child.stderr.strip().splitlines() or ['no output'])[-1]}
+
+def compare(results, baseline):
+    """ Returns a list of human-readable regressions of ``results`` against ``baseline``. """
+    regressions = []
+    for name, result in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or before.get('status') != 'ok' or result.get('status') != 'ok':
+            continue
+        for metric, (better, relative, slack) in REGRESSION_RULES.items():
+            if metric not in result or metric not in before:
+                continue
+            old, new = before[metric], result[metric]
+            worse = old - new if better == 'higher' else new - old
+            if worse > slack and worse > abs(old) * relative:
+                regressions.append(f"{name}.{metric}: {old} -> {new}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--save', metavar='FILE', help="write the results as JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="results to compare against; exit 1 on regression")
+    parser.add_argument('--child', nargs='+', metavar=('SCENARIO', 'URL'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child_main(args.child[0], args.child[1:])
+
+    results = {'python': platform.python_version(), 'platform': platform.platform(),
+               'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scenarios': {}}
+    for name in args.scenarios:
+        result = results['scenarios'][name] = run_scenario(name)
+        details = ', '.join(f"{key} {value}" for key, value in result.items() if key != 'status')
+        print(f"{name:>12}: {result['status']}  {details}", flush=True)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    failed = [name for name, result in results['scenarios'].items() if result['status'] == 'failed']
+    for name in failed:
+        print(f"FAIL: {name} did not complete")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f))
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if not regressions:
+            print("No regressions against the baseline")
+    return 1 if failed or regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
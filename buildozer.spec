@@ -7,7 +7,7 @@ source.dir = .
 source.include_exts = py,png,jpg,kv,atlas,ttf,json
 
 version = 1.0.0
-requirements = python3,kivy==2.3.0,yt-dlp==2023.11.16,requests==2.31.0,pillow==10.0.1,urllib3==2.0.7,certifi==2023.7.22
+requirements = python3,sqlite3,kivy==2.3.0,yt-dlp==2023.11.16,requests==2.31.0,pillow==10.0.1,urllib3==2.0.7,certifi==2023.7.22
 
 [buildozer]
 log_level = 2
@@ -1,5 +1,8 @@
+import time
+STARTED_AT = time.perf_counter()  # Startup phases are timed from here, before Kivy loads
+
 import os
-import threading
+from collections import OrderedDict
 from functools import partial
 from kivy.app import App
 from kivy.lang import Builder
@@ -8,22 +11,47 @@ from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.modalview import ModalView
 from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivy.clock import Clock
+from kivy.core.image import Image as CoreImage
+from kivy.factory import Factory
 from kivy.core.window import Window
 from kivy.properties import (
-    StringProperty, NumericProperty, ListProperty,
+    StringProperty, NumericProperty,
     BooleanProperty, DictProperty, ObjectProperty
 )
 from kivy.metrics import dp, sp
 from kivy.animation import Animation
-from kivy.utils import get_color_from_hex
+from kivy.utils import get_color_from_hex, platform
+
+from torro.engine import Engine
+from torro.formats import FormatPolicy
+from torro.manager import preload_yt_dlp
+from torro.metrics import StartupTimer
+from torro.network import is_metered
+from torro.store import ActiveDownloadsView, HistoryView, apply_row
+
+startup_timer = StartupTimer(STARTED_AT)
+startup_timer.mark('imports')
+
+# --- Download history ---
+HISTORY_PREFETCH_SCROLL = 0.1     # Load the next page when scroll_y drops below this
+
+# --- Thumbnails ---
+THUMBNAIL_PLACEHOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'placeholder.png')
+THUMBNAIL_TEXTURE_CACHE = 64  # Decoded textures kept around for RecycleView recycling
+
+# --- Cold start ---
+YT_DLP_PRELOAD = True  # Import yt-dlp in the background after the first frame; False waits for the first job
+DEFERRED_SCREENS = {'downloads': 'DownloadsScreen', 'settings': 'DiagnosticsScreen'}  # Built on first visit
+
+# --- UI refresh rate for download progress ---
+PROGRESS_TICK_HZ = 10  # Buffered progress is applied to the RecycleViews this often
 
-# --- Try to import yt-dlp ---
-try:
-    import yt_dlp
-    YT_DLP_AVAILABLE = True
-except ImportError:
-    YT_DLP_AVAILABLE = False
-    print("WARNING: yt-dlp not found. Install with: pip install yt-dlp")
+# --- Network ---
+NETWORK_POLL_SECONDS = 30  # How often to check for a metered connection and switch rate limits
+
+# --- Diagnostics ---
+DIAGNOSTICS_REFRESH_SECONDS = 1.0
+DIAGNOSTICS_RECENT_JOBS = 5    # Per-job timings listed on the diagnostics panel
 
 # --- Set a standard mobile window size ---
 Window.size = (375, 812) # Emulates an iPhone X/11/12 screen
@@ -72,8 +100,8 @@ KV_STRING = """
             size: self.size
             radius: root.radius_small
 
-    AsyncImage:
-        source: root.thumbnail
+    Image:
+        texture: root.thumbnail_texture
         size_hint_x: None
         width: dp(100)
         radius: root.radius_small
@@ -139,7 +167,7 @@ KV_STRING = """
             text: root.status.capitalize()
             font_size: sp(12)
             color: (root.theme_success if root.status == 'completed' else \
-                    root.theme_warning if root.status == 'downloading' else \
+                    root.theme_warning if root.status in ('downloading', 'processing', 'paused') else \
                     root.theme_error if root.status == 'error' else \
                     root.theme_text_secondary)
             bold: True
@@ -149,6 +177,33 @@ KV_STRING = """
             font_size: sp(11)
             color: root.theme_text_secondary
 
+        BoxLayout:
+            size_hint_y: None
+            height: dp(24)
+            opacity: 1 if root.status in ('queued', 'downloading', 'paused') else 0
+            disabled: root.status not in ('queued', 'downloading', 'paused')
+            Button:
+                text: '\\ue5d8' # Arrow up icon: foreground bandwidth lane
+                font_name: 'fonts/MaterialIcons-Regular.ttf'
+                font_size: sp(18)
+                background_color: [0,0,0,0]
+                color: root.theme_accent if app.foreground_id == root.id else root.theme_text_secondary
+                on_press: app.toggle_foreground(root.id)
+            Button:
+                text: '\\ue037' if root.status == 'paused' else '\\ue034' # Play / pause icons
+                font_name: 'fonts/MaterialIcons-Regular.ttf'
+                font_size: sp(18)
+                background_color: [0,0,0,0]
+                color: root.theme_text_secondary
+                on_press: app.toggle_pause(root.id)
+            Button:
+                text: '\\ue5cd' # Close icon
+                font_name: 'fonts/MaterialIcons-Regular.ttf'
+                font_size: sp(18)
+                background_color: [0,0,0,0]
+                color: root.theme_error
+                on_press: app.cancel_download(root.id)
+
 
 <NavButton@ButtonBehavior+BoxLayout>:
     orientation: 'vertical'
@@ -205,6 +260,108 @@ KV_STRING = """
         anim.bind(on_complete=lambda *args: self.remove_widget(ripple))
         anim.start(self.ripple_circle)
 
+<ImportDialog@ModalView>:
+    size_hint: 0.92, 0.8
+    BoxLayout:
+        orientation: 'vertical'
+        padding: dp(10)
+        spacing: dp(10)
+        canvas.before:
+            Color:
+                rgba: root.theme_secondary_bg
+            Rectangle:
+                pos: self.pos
+                size: self.size
+        Label:
+            text: "Import a text file with one URL per line"
+            size_hint_y: None
+            height: dp(30)
+            color: root.theme_text_primary
+        FileChooserListView:
+            id: chooser
+            path: app.import_start_path
+            filters: ['*.txt']
+        BoxLayout:
+            size_hint_y: None
+            height: dp(48)
+            spacing: dp(10)
+            Button:
+                text: 'CANCEL'
+                on_press: root.dismiss()
+            Button:
+                text: 'IMPORT'
+                background_color: root.theme_accent
+                on_press:
+                    app.import_url_file(chooser.selection)
+                    root.dismiss()
+
+#<--- SCREENS BUILT ON FIRST VISIT (see DEFERRED_SCREENS) --- >
+<DownloadsScreen@Screen>:
+    name: 'downloads'
+    BoxLayout:
+        orientation: 'vertical'
+        padding: root.padding_normal
+        spacing: root.spacing_normal
+
+        Label:
+            text: "Download History"
+            font_size: sp(20)
+            bold: True
+            size_hint_y: None
+            height: dp(30)
+            halign: 'left'
+            text_size: self.size
+            color: root.theme_text_primary
+
+        RecycleView:
+            id: downloads_rv
+            viewclass: 'DownloadCard'
+            RecycleBoxLayout:
+                default_size: None, dp(90)
+                default_size_hint: 1, None
+                size_hint_y: None
+                height: self.minimum_height
+                orientation: 'vertical'
+                spacing: root.spacing_normal
+
+<DiagnosticsScreen@Screen>:
+    name: 'settings'
+    BoxLayout:
+        orientation: 'vertical'
+        padding: root.padding_normal
+        spacing: root.spacing_normal
+
+        Label:
+            text: "Diagnostics"
+            font_size: sp(20)
+            bold: True
+            size_hint_y: None
+            height: dp(30)
+            halign: 'left'
+            text_size: self.size
+            color: root.theme_text_primary
+
+        ScrollView:
+            Label:
+                text: app.diagnostics_text
+                font_size: sp(12)
+                color: root.theme_text_secondary
+                size_hint_y: None
+                height: self.texture_size[1]
+                text_size: self.width, None
+                halign: 'left'
+
+        BoxLayout:
+            size_hint_y: None
+            height: dp(48)
+            spacing: dp(10)
+            Button:
+                text: 'EXPORT JSON'
+                on_press: app.export_metrics('json')
+            Button:
+                text: 'EXPORT PROMETHEUS'
+                on_press: app.export_metrics('prom')
+
 #<--- MAIN APP LAYOUT --- >
 FloatLayout:
     canvas.before:
@@ -273,13 +430,22 @@ FloatLayout:
                             radius: root.radius_normal
                     TextInput:
                         id: url_input
-                        hint_text: "Paste video URL here..."
+                        hint_text: "Paste video, playlist or several URLs..."
                         background_color: [0,0,0,0]
                         foreground_color: root.theme_text_primary
                         cursor_color: root.theme_accent
                         font_size: sp(16)
                         padding: [dp(15), (self.height - self.font_size)/2]
                         multiline: False
+                    Button:
+                        text: '\\ue2c6' # File upload icon
+                        font_name: 'fonts/MaterialIcons-Regular.ttf'
+                        font_size: sp(22)
+                        size_hint_x: None
+                        width: dp(44)
+                        background_color: [0,0,0,0]
+                        color: root.theme_text_secondary
+                        on_press: Factory.ImportDialog().open()
                     Button:
                         text: 'DOWNLOAD'
                         size_hint_x: None
@@ -307,7 +473,6 @@ FloatLayout:
 
                 RecycleView:
                     id: home_rv
-                    data: app.get_active_downloads()
                     viewclass: 'DownloadCard'
                     RecycleBoxLayout:
                         default_size: None, dp(90)
@@ -317,44 +482,6 @@ FloatLayout:
                         orientation: 'vertical'
                         spacing: root.spacing_normal
         
-        Screen:
-            name: 'downloads'
-            BoxLayout:
-                orientation: 'vertical'
-                padding: root.padding_normal
-                spacing: root.spacing_normal
-
-                Label:
-                    text: "Download History"
-                    font_size: sp(20)
-                    bold: True
-                    size_hint_y: None
-                    height: dp(30)
-                    halign: 'left'
-                    text_size: self.size
-                    color: root.theme_text_primary
-
-                RecycleView:
-                    id: downloads_rv
-                    data: app.downloads_data
-                    viewclass: 'DownloadCard'
-                    RecycleBoxLayout:
-                        default_size: None, dp(90)
-                        default_size_hint: 1, None
-                        size_hint_y: None
-                        height: self.minimum_height
-                        orientation: 'vertical'
-                        spacing: root.spacing_normal
-        
-        Screen:
-            name: 'settings'
-            BoxLayout:
-                padding: root.padding_normal
-                Label:
-                    text: "Settings Screen - Coming Soon!"
-                    font_size: sp(20)
-                    color: root.theme_text_secondary
-
     # --- Bottom Navigation ---
     BoxLayout:
         id: bottom_nav
@@ -380,186 +507,293 @@ FloatLayout:
             is_active: app.current_screen == 'downloads'
         NavButton:
             screen_name: 'settings'
-            icon: '\\ue8b8' # Settings icon
-            label: 'Settings'
+            icon: '\\ue868' # Bug report icon
+            label: 'Diagnostics'
             is_active: app.current_screen == 'settings'
 
 """
 
 #<--- PYTHON LOGIC --->
 
-class DownloadManager:
-    """ Manages the yt-dlp download process in a separate thread. """
-    def __init__(self, app_instance):
-        self.app = app_instance
-        self.download_folder = "Torro_Downloads"
-        if not os.path.exists(self.download_folder):
-            os.makedirs(self.download_folder)
-
-    def run_download(self, download_item):
-        """ The function that will run in a separate thread. """
+class ThumbnailTextures:
+    """ LRU of decoded thumbnail textures shared by every DownloadCard.
+
+    Only local, already downscaled files are decoded; anything else (an
+    empty value, or a remote URL left over in old history rows) shows the
+    bundled placeholder, so recycling cards never touches the network.
+    """
+    def __init__(self, capacity=THUMBNAIL_TEXTURE_CACHE):
+        self.capacity = capacity
+        self._textures = OrderedDict()  # path -> Texture
+        self._placeholder = None
+
+    @property
+    def placeholder(self):
+        if self._placeholder is None:
+            self._placeholder = CoreImage(THUMBNAIL_PLACEHOLDER).texture
+        return self._placeholder
+
+    def get(self, path):
+        if not path or '://' in path:
+            return self.placeholder
+        texture = self._textures.get(path)
+        if texture is not None:
+            self._textures.move_to_end(path)
+            return texture
         try:
-            ydl_opts = {
-                'outtmpl': os.path.join(self.download_folder, '%(title)s [%(height)sp].%(ext)s'),
-                'progress_hooks': [partial(self.progress_hook, download_item['id'])],
-                'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
-                'noplaylist': True,
-                'quiet': True,
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # First, extract info to get title and thumbnail
-                info = ydl.extract_info(download_item['url'], download=False)
-                title = info.get('title', 'Unknown Title')
-                thumbnail = info.get('thumbnail', '')
-                
-                # Schedule UI update on main thread
-                Clock.schedule_once(lambda dt: self.app.update_download_info(download_item['id'], title, thumbnail))
-                
-                # Now, start the actual download
-                ydl.download([download_item['url']])
-
-        except Exception as e:
-            error_message = str(e).split(':')[-1].strip()
-            Clock.schedule_once(lambda dt: self.app.update_download_status(download_item['id'], 'error', error_message))
-            print(f"Error downloading {download_item['url']}: {e}")
-
-    def progress_hook(self, download_id, d):
-        """ yt-dlp hook to capture download progress. """
-        if d['status'] == 'downloading':
-            total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
-            if total_bytes:
-                progress = (d['downloaded_bytes'] / total_bytes) * 100
-                speed = d.get('speed')
-                speed_str = f"{speed / 1024 / 1024:.2f} MB/s" if speed else ""
-                
-                # Schedule UI update on main thread to avoid crashes
-                Clock.schedule_once(lambda dt: self.app.update_download_progress(download_id, progress, speed_str))
-        
-        elif d['status'] == 'finished':
-            Clock.schedule_once(lambda dt: self.app.update_download_status(download_id, 'completed', 'Finished'))
+            texture = CoreImage(path).texture
+        except Exception:
+            return self.placeholder  # Evicted from disk; keep scrolling
+        self._textures[path] = texture
+        if len(self._textures) > self.capacity:
+            self._textures.popitem(last=False)
+        return texture
 
 class DownloadCard(RecycleDataViewBehavior, BoxLayout):
     """ The View Class for an item in the RecycleView. """
     index = None
+    id = StringProperty('')  # Download id; a property so that KV bound to root.id follows recycling
     title = StringProperty("Fetching title...")
     status = StringProperty("queued")
     progress = NumericProperty(0)
-    thumbnail = StringProperty('https://via.placeholder.com/150.png?text=TORRO')
+    thumbnail = StringProperty('')  # Local path from ThumbnailCache, '' for the placeholder
+    thumbnail_texture = ObjectProperty(None, allownone=True)
     speed = StringProperty("")
     
-    # Re-use theme variables from KV
-    theme_card_bg = ListProperty(get_color_from_hex('#2A2A2A'))
-    theme_secondary_bg = ListProperty(get_color_from_hex('#1E1E1E'))
-    theme_text_primary = ListProperty(get_color_from_hex('#FFFFFF'))
-    theme_text_secondary = ListProperty(get_color_from_hex('#B0B0B0'))
-    theme_accent = ListProperty(get_color_from_hex('#E53935'))
-    theme_success = ListProperty(get_color_from_hex('#4CAF50'))
-    theme_warning = ListProperty(get_color_from_hex('#FFC107'))
-    theme_error = ListProperty(get_color_from_hex('#F44336'))
-    radius_small = ListProperty([dp(12),])
-    spacing_normal = NumericProperty(dp(15))
+    row = None        # The Row last applied, and its version; see torro.store.apply_row
+    row_version = -1
+
+    # Theme values from KV. Plain class attributes, shared by every card:
+    # they never change, so per-instance Kivy properties would only cost memory.
+    theme_card_bg = get_color_from_hex('#2A2A2A')
+    theme_secondary_bg = get_color_from_hex('#1E1E1E')
+    theme_text_primary = get_color_from_hex('#FFFFFF')
+    theme_text_secondary = get_color_from_hex('#B0B0B0')
+    theme_accent = get_color_from_hex('#E53935')
+    theme_success = get_color_from_hex('#4CAF50')
+    theme_warning = get_color_from_hex('#FFC107')
+    theme_error = get_color_from_hex('#F44336')
+    radius_small = [dp(12),]
+    spacing_normal = dp(15)
+
+    def __init__(self, **kwargs):
+        super(DownloadCard, self).__init__(**kwargs)
+        self.on_thumbnail(self, self.thumbnail)
+
+    def on_thumbnail(self, instance, path):
+        self.thumbnail_texture = App.get_running_app().thumbnail_textures.get(path)
 
     def refresh_view_attrs(self, rv, index, data):
-        """ Catches the ViewHolder behavior and re-assigns attributes. """
+        """ Catches the ViewHolder behavior and applies only the fields that changed. """
         self.index = index
-        for key, value in data.items():
-            setattr(self, key, value)
-        return super(DownloadCard, self).refresh_view_attrs(rv, index, data)
+        apply_row(self, data)
 
 class TorroApp(App):
     # --- App Properties ---
     current_screen = StringProperty("home")
-    downloads_data = ListProperty([]) # This will drive the RecycleView
+    import_start_path = StringProperty('/storage/emulated/0/Download' if platform == 'android'
+                                       else os.path.expanduser('~'))
+
+    startup_report = StringProperty('')  # Startup phase timings, once the app is ready
+    diagnostics_text = StringProperty('')
+    foreground_id = StringProperty('')  # Job in the foreground bandwidth lane, '' for none
+
+    def on_start(self):
+        # One fixed-rate tick applies all buffered progress in a single batch
+        Clock.schedule_interval(self.apply_progress_updates, 1 / PROGRESS_TICK_HZ)
+        Window.bind(on_flip=self.on_first_frame)
+        Clock.schedule_interval(self.on_frame, 0)
+        Clock.schedule_interval(self.refresh_diagnostics, DIAGNOSTICS_REFRESH_SECONDS)
+        self.check_network(0)
+        Clock.schedule_interval(self.check_network, NETWORK_POLL_SECONDS)
 
     def build(self):
         self.title = "TORRO Video Downloader"
-        self.download_manager = DownloadManager(self)
+        self.startup = startup_timer
+        self.thumbnail_textures = ThumbnailTextures()
+        # The app is one subscriber of the headless engine; worker events are
+        # marshalled onto the Kivy main thread before they touch any row.
+        # On a phone there is no point fetching more lines than the screen has
+        screen_height = min(Window.size) if platform == 'android' else None
+        self.engine = Engine(self.user_data_dir, call_soon=self.call_soon,
+                             thumbnail_size=(int(dp(100)), int(dp(90))),
+                             format_policy=FormatPolicy(screen_height=screen_height))
+        self.store = self.engine.store
+        self.metrics = self.engine.metrics
+        self.active_view = ActiveDownloadsView(self.store)
+        self.history_view = HistoryView(self.store)
+        self.engine.start()
         # Load the UI from the KV_STRING
-        return Builder.load_string(KV_STRING)
+        root = Builder.load_string(KV_STRING)
+
+        # Each RecycleView follows one source list; only the one on screen
+        # is kept in sync, the other is resynced when the user switches to it.
+        # Screens in DEFERRED_SCREENS join _rv_sources once they are built.
+        self._rv_sources = {'home': (root.ids.home_rv, self.active_view.rows)}
+        self._stale_screens = set()
+        root.ids.home_rv.data = self.active_view.rows
+        self.active_view.bind(partial(self.on_rows_changed, 'home'))
+        self.history_view.bind(partial(self.on_rows_changed, 'downloads'))
+        self._history_scroll_offset = None
+        self.startup.mark('build')
+        return root
+
+    def on_first_frame(self, window):
+        window.unbind(on_flip=self.on_first_frame)
+        self.startup.mark('first_frame')
+        if YT_DLP_PRELOAD:
+            preload_yt_dlp(callback=lambda: self.on_startup_phase('yt_dlp'))
+        else:
+            self.on_startup_phase('ready')
+
+    def on_startup_phase(self, phase):
+        """ Marks a late startup phase; may be called from the yt-dlp import thread. """
+        self.startup.mark(phase)
+        if phase == 'yt_dlp':
+            self.startup.mark('ready')
+        self.call_soon(self._publish_startup_report)
+
+    def _publish_startup_report(self):
+        self.startup_report = self.startup.report()
+        for phase, seconds in self.startup.marks.items():
+            self.metrics.set_gauge('startup_seconds', seconds, phase=phase)
+        print(f"Startup: {self.startup_report}")
+
+    # --- Diagnostics ---
+    def on_frame(self, dt):
+        self.metrics.observe('frame_seconds', dt)
+
+    def refresh_diagnostics(self, dt):
+        self.metrics.set_gauge('clock_events', len(Clock.get_events()))
+        if self.current_screen != 'settings':
+            return
+        lines = [f"Startup: {self.startup_report or 'in progress'}", '']
+        lines.extend(self.metrics.report_lines())
+        lines.extend(['', "Recent jobs:"])
+        for job in self.metrics.recent_jobs()[:DIAGNOSTICS_RECENT_JOBS]:
+            parts = [f"{phase} {job[phase + '_s']:.2f}s" for phase in ('extract', 'ttfb', 'merge')
+                     if job[phase + '_s'] is not None]
+            if job['throughput_bps']:
+                parts.append(f"{job['throughput_bps'] / 1024 / 1024:.2f} MB/s")
+            lines.append(f"#{job['id']} {job['status']}: {', '.join(parts)}")
+        self.diagnostics_text = '\n'.join(lines)
+
+    def export_metrics(self, kind):
+        """ Writes the current metrics to the app data folder as JSON or Prometheus text. """
+        path = os.path.join(self.user_data_dir, 'metrics.json' if kind == 'json' else 'metrics.prom')
+        try:
+            self.metrics.write(path)
+            print(f"Metrics written to {path}")
+        except OSError as e:
+            print(f"Cannot write {path}: {e}")
+
+    def build_screen(self, screen_name):
+        """ Creates a screen from DEFERRED_SCREENS the first time it is shown. """
+        screen_manager = self.root.ids.screen_manager
+        if screen_manager.has_screen(screen_name):
+            return
+        screen = getattr(Factory, DEFERRED_SCREENS[screen_name])()
+        screen_manager.add_widget(screen)
+        if screen_name == 'downloads':
+            rv = screen.ids.downloads_rv
+            self._rv_sources['downloads'] = (rv, self.history_view.rows)
+            self._stale_screens.add('downloads')
+            rv.bind(scroll_y=self.on_history_scroll)
+            rv.layout_manager.bind(height=self.on_history_layout_height)
+
+    def on_stop(self):
+        self.engine.close()
+
+    @staticmethod
+    def call_soon(fn, *args):
+        Clock.schedule_once(lambda dt: fn(*args))
 
     def switch_screen(self, screen_name):
+        if screen_name in DEFERRED_SCREENS:
+            self.build_screen(screen_name)
         self.root.ids.screen_manager.current = screen_name
         self.current_screen = screen_name
-
-    def start_download_from_input(self, url):
-        url = url.strip()
-        if not url:
-            # Simple feedback, could be a toast notification
-            print("URL cannot be empty")
+        if screen_name in self._stale_screens:
+            self._stale_screens.discard(screen_name)
+            rv, source = self._rv_sources[screen_name]
+            with self.metrics.timed('refresh_recycle_views_seconds'):
+                rv.data = source  # Full resync: the screen missed row changes while hidden
+        if screen_name == 'downloads' and not self.history_view.loaded:
+            self.history_view.load_more()
+
+    def start_download_from_input(self, text):
+        """ Queues every URL in the input: one, several, or playlist links. """
+        if self.engine.add_downloads(text):
+            # Clear the input field
+            self.root.ids.url_input.text = ""
+
+    def import_url_file(self, selection):
+        """ Queues the URLs listed in a text file picked in the ImportDialog. """
+        if not selection:
             return
-        
-        if not YT_DLP_AVAILABLE:
-            print("Cannot start download, yt-dlp is not available.")
+        try:
+            with open(selection[0], encoding='utf-8', errors='replace') as f:
+                self.engine.add_downloads(f.read())
+        except OSError as e:
+            print(f"Cannot read {selection[0]}: {e}")
+
+    def toggle_pause(self, download_id):
+        self.engine.toggle_pause(download_id)
+
+    def cancel_download(self, download_id):
+        self.engine.cancel(download_id)
+
+    def toggle_foreground(self, download_id):
+        """ Gives a job most of the bandwidth limit, or takes it back. """
+        self.foreground_id = '' if self.foreground_id == download_id else download_id
+        self.engine.set_foreground(self.foreground_id or None)
+
+    def check_network(self, dt):
+        self.engine.set_metered(is_metered())
+
+    def apply_progress_updates(self, dt):
+        """ Applies every dirty row from the engine's progress buffer in one batch. """
+        # Only the affected rows are refreshed, via on_rows_changed
+        self.engine.apply_progress()
+
+    # --- RecycleView syncing ---
+    def on_rows_changed(self, screen_name, event, index, rows):
+        """ Row-level change from ActiveDownloadsView or HistoryView. """
+        if screen_name != self.current_screen or screen_name not in self._rv_sources:
+            self._stale_screens.add(screen_name)
             return
-
-        download_id = str(len(self.downloads_data))
-        new_download = {
-            'id': download_id,
-            'url': url,
-            'title': "Fetching details...",
-            'thumbnail': 'https://via.placeholder.com/150.png?text=QUEUED',
-            'status': 'queued',
-            'progress': 0,
-            'speed': ''
-        }
-        
-        # Prepend to list so it appears at the top
-        self.downloads_data.insert(0, new_download)
-        
-        # Clear the input field
-        self.root.ids.url_input.text = ""
-        
-        # Start download in a background thread
-        threading.Thread(target=self.download_manager.run_download, args=(new_download,), daemon=True).start()
-
-    # --- Methods to update the UI from other threads ---
-    def find_download_index(self, download_id):
-        for i, item in enumerate(self.downloads_data):
-            if item['id'] == download_id:
-                return i
-        return -1
-
-    def update_download_info(self, download_id, title, thumbnail):
-        index = self.find_download_index(download_id)
-        if index != -1:
-            self.downloads_data[index]['title'] = title
-            self.downloads_data[index]['thumbnail'] = thumbnail
-            self.downloads_data[index]['status'] = 'downloading'
-            self.refresh_recycle_views()
-
-    def update_download_progress(self, download_id, progress, speed):
-        index = self.find_download_index(download_id)
-        if index != -1:
-            self.downloads_data[index]['progress'] = progress
-            self.downloads_data[index]['speed'] = speed
-            # No full refresh needed, Kivy properties handle this
-            self.root.ids.home_rv.refresh_from_data()
-            self.root.ids.downloads_rv.refresh_from_data()
-
-
-    def update_download_status(self, download_id, status, message=""):
-        index = self.find_download_index(download_id)
-        if index != -1:
-            self.downloads_data[index]['status'] = status
-            if status == 'completed':
-                self.downloads_data[index]['progress'] = 100
-                self.downloads_data[index]['speed'] = '✅'
-            elif status == 'error':
-                 self.downloads_data[index]['speed'] = '❌'
-                 self.downloads_data[index]['title'] = f"Error: {message}"
-            self.refresh_recycle_views()
-
-    def get_active_downloads(self):
-        """ Filters downloads for the home screen view. """
-        return [d for d in self.downloads_data if d['status'] in ['downloading', 'queued', 'error']]
-
-    def refresh_recycle_views(self):
-        """ Force refresh data in both RecycleViews. """
-        self.root.ids.home_rv.data = self.get_active_downloads()
-        self.root.ids.downloads_rv.data = self.downloads_data
-        self.root.ids.home_rv.refresh_from_data()
-        self.root.ids.downloads_rv.refresh_from_data()
+        rv = self._rv_sources[screen_name][0]
+        with self.metrics.timed('refresh_recycle_views_seconds'):
+            if event == 'insert':
+                rv.data[index:index] = rows
+            elif event == 'remove':
+                del rv.data[index:index + len(rows)]
+            else:
+                # Rows are shared objects, so rv.data already holds the new values;
+                # just re-apply them to the cards that are currently visible.
+                for offset, row in enumerate(rows):
+                    view = rv.view_adapter.get_visible_view(index + offset)
+                    if view is not None:
+                        view.refresh_view_attrs(rv, index + offset, row)
+
+    def on_history_scroll(self, rv, scroll_y):
+        """ Pages in older history as the Downloads list nears its bottom (scroll_y == 0). """
+        if (scroll_y > HISTORY_PREFETCH_SCROLL or self.history_view.exhausted
+                or self._history_scroll_offset is not None or not self.history_view.loaded):
+            return
+        # Remember where the viewport is so the list does not jump once it grows
+        scrollable = max(rv.layout_manager.height - rv.height, 0)
+        self._history_scroll_offset = (1 - scroll_y) * scrollable
+        if not self.history_view.load_more():
+            self._history_scroll_offset = None
+
+    def on_history_layout_height(self, layout, height):
+        if self._history_scroll_offset is None:
+            return
+        rv = layout.parent
+        scrollable = max(height - rv.height, 1)
+        rv.scroll_y = max(0, 1 - self._history_scroll_offset / scrollable)
+        self._history_scroll_offset = None
 
 if __name__ == '__main__':
     TorroApp().run()
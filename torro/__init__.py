@@ -0,0 +1 @@
+""" Kivy-independent building blocks used by the Torro Pro app. """
@@ -0,0 +1,5 @@
+import sys
+
+from torro.cli import main
+
+sys.exit(main())
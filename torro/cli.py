@@ -0,0 +1,225 @@
+""" Headless front end for the Torro download engine.
+
+    python -m torro get URL [URL ...] [--file urls.txt]
+    python -m torro daemon --inbox DIR
+
+``get`` queues the given URLs, plus any unfinished jobs left in the data
+directory, and exits once nothing is queued or running. ``daemon`` keeps
+running and queues every URL written to stdin or dropped into ``--inbox``
+as a .txt file. Neither imports Kivy.
+"""
+import argparse
+import glob
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from torro.engine import METERED_RATE_LIMIT, Engine
+from torro.manager import MAX_CONCURRENT_DOWNLOADS, SEGMENTED_DOWNLOAD_SEGMENTS
+
+DEFAULT_DATA_DIR = os.path.join(os.path.expanduser('~'), '.torro')
+TICK_SECONDS = 0.25      # How often progress is applied and printed
+INBOX_POLL_SECONDS = 2.0
+METRICS_WRITE_SECONDS = 10.0  # How often the daemon refreshes --metrics
+
+class Runner:
+    """ Owner thread for an Engine: runs call_soon callbacks from a queue. """
+    def __init__(self, args):
+        self.args = args
+        self.calls = queue.Queue()
+        self.failed = 0
+        self.engine = Engine(args.data_dir, call_soon=self.call_soon, download_folder=args.output,
+                             max_workers=args.workers, segments=args.segments,
+                             rate_limit=mb_to_bytes(args.rate_limit),
+                             metered_rate_limit=mb_to_bytes(args.metered_rate_limit),
+                             storage_quota=mb_to_bytes(args.quota),
+                             storage_max_age=args.max_age * 86400 if args.max_age else None)
+        self.engine.set_metered(args.metered)
+        self.engine.bus.subscribe(self.on_event, 'added', 'info', 'metadata', 'status')
+        self.engine.store.bind(self.on_row)
+        self._last_progress = {}  # download id -> last printed percent
+
+    def call_soon(self, fn, *args):
+        self.calls.put((fn, args))
+
+    def run_pending(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                fn, args = self.calls.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                break
+            fn(*args)
+        self.engine.metrics.set_gauge('callback_queue_depth', self.calls.qsize())
+        self.engine.apply_progress()
+
+    def serve(self, done=None, poll=None):
+        """ Processes engine callbacks until ``done()`` is true, calling ``poll()`` every tick. """
+        next_metrics = time.monotonic() + METRICS_WRITE_SECONDS
+        while not (done and done()):
+            if poll:
+                poll()
+            self.run_pending(TICK_SECONDS)
+            if self.args.metrics and time.monotonic() >= next_metrics:
+                next_metrics = time.monotonic() + METRICS_WRITE_SECONDS
+                self.write_metrics()
+
+    def write_metrics(self):
+        try:
+            self.engine.metrics.write(self.args.metrics)
+        except OSError as e:
+            print(f"Cannot write {self.args.metrics}: {e}", file=sys.stderr)
+
+    # --- Output ---
+    def emit(self, event, download_id, **fields):
+        if self.args.json:
+            print(json.dumps(dict(event=event, id=download_id, **fields)), flush=True)
+        elif event == 'progress':
+            print(f"[{download_id}] {fields['progress']:5.1f}% {fields['speed']}", flush=True)
+        else:
+            details = ' '.join(str(value) for value in fields.values() if value not in (None, ''))
+            print(f"[{download_id}] {event}: {details}", flush=True)
+
+    def on_event(self, event, *args):
+        # Worker threads emit these; print from the owner thread only
+        self.call_soon(self._print_event, event, *args)
+
+    def _print_event(self, event, *args):
+        if event == 'added':
+            row = args[0]
+            self.emit('added', row['id'], url=row['url'])
+        elif event == 'info':
+            download_id, title, thumbnail = args
+            self.emit('info', download_id, title=title)
+        elif event == 'metadata':
+            download_id, title, thumbnail, duration = args
+            self.emit('metadata', download_id, title=title, duration=duration)
+        elif event == 'status':
+            download_id, status, message = args
+            if status == 'error':
+                self.failed += 1
+            self._last_progress.pop(download_id, None)
+            self.emit('status', download_id, status=status, message=message)
+
+    def on_row(self, event, row):
+        """ Store listener; prints progress in whole-percent steps. """
+        if event != 'update' or row['status'] not in ('downloading', 'processing') or not row['speed']:
+            return
+        progress = int(row['progress'])
+        if self._last_progress.get(row['id']) != progress:
+            self._last_progress[row['id']] = progress
+            self.emit('progress', row['id'], progress=row['progress'], speed=row['speed'])
+
+def format_options(args):
+    """ FormatPolicy overrides from the command line, applied to every URL of this run. """
+    options = {}
+    if args.format:
+        options['format'] = args.format
+    if args.max_height:
+        options['max_height'] = args.max_height
+    if args.no_merge:
+        options['allow_merge'] = False
+    if args.audio_only:
+        options['audio_only'] = True
+    return options or None
+
+def mb_to_bytes(value):
+    return int(value * 1024 * 1024) if value else None
+
+def read_url_file(path):
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+def cmd_get(runner):
+    args = runner.args
+    text = '\n'.join(args.urls)
+    for path in args.file:
+        text += '\n' + read_url_file(path)
+    if text.strip():
+        added = runner.engine.add_downloads(text, format_options(args))
+        if not added and runner.engine.pending_count() == 0:
+            return 2
+    runner.serve(done=lambda: runner.engine.pending_count() == 0)
+    return 1 if runner.failed else 0
+
+def cmd_daemon(runner):
+    args = runner.args
+    next_poll = [0.0]
+
+    def poll_inbox():
+        if not args.inbox or time.monotonic() < next_poll[0]:
+            return
+        next_poll[0] = time.monotonic() + INBOX_POLL_SECONDS
+        for path in sorted(glob.glob(os.path.join(args.inbox, '*.txt'))):
+            try:
+                text = read_url_file(path)
+                # Renamed first so a crash never queues the same file twice
+                os.replace(path, path[:-len('.txt')] + '.queued')
+            except OSError as e:
+                print(f"Cannot read {path}: {e}", file=sys.stderr)
+                continue
+            runner.engine.add_downloads(text, format_options(args))
+
+    def read_stdin():
+        for line in sys.stdin:
+            if line.strip():
+                runner.call_soon(runner.engine.add_downloads, line, format_options(args))
+
+    if args.inbox:
+        os.makedirs(args.inbox, exist_ok=True)
+    if not sys.stdin.isatty():
+        threading.Thread(target=read_stdin, name='torro-stdin', daemon=True).start()
+    runner.serve(poll=poll_inbox)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='torro', description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR,
+                        help="history, journal and caches (default: %(default)s)")
+    parser.add_argument('--output', help="download folder (default: Downloads/Torro in your home)")
+    parser.add_argument('--workers', type=int, default=MAX_CONCURRENT_DOWNLOADS)
+    parser.add_argument('--segments', type=int, default=SEGMENTED_DOWNLOAD_SEGMENTS,
+                        help="parallel ranges for progressive formats, 0 to disable")
+    parser.add_argument('--rate-limit', type=float, metavar='MB/S', help="total bandwidth for all jobs")
+    parser.add_argument('--metered', action='store_true', help="use --metered-rate-limit instead")
+    parser.add_argument('--metered-rate-limit', type=float, metavar='MB/S',
+                        default=METERED_RATE_LIMIT / 1024 / 1024, help="(default: %(default)g)")
+    parser.add_argument('--quota', type=float, metavar='MB',
+                        help="delete the least recently used downloads to stay under this")
+    parser.add_argument('--max-age', type=float, metavar='DAYS', help="delete downloads unused for this long")
+    parser.add_argument('--format', metavar='SPEC', help="yt-dlp format spec, bypassing the format policy")
+    parser.add_argument('--max-height', type=int, metavar='PX', help="tallest video to pick, e.g. 720")
+    parser.add_argument('--no-merge', action='store_true', help="only pick single-file formats (no ffmpeg)")
+    parser.add_argument('--audio-only', action='store_true')
+    parser.add_argument('--json', action='store_true', help="print events as JSON lines")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="write metrics on exit (and periodically as a daemon): "
+                             "JSON for *.json, Prometheus text otherwise")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    get = commands.add_parser('get', help="download URLs and unfinished jobs, then exit")
+    get.add_argument('urls', nargs='*')
+    get.add_argument('--file', action='append', default=[], help="text file with one URL per line")
+    get.set_defaults(handler=cmd_get)
+
+    daemon = commands.add_parser('daemon', help="keep running and queue URLs as they arrive")
+    daemon.add_argument('--inbox', help="directory polled for *.txt URL lists")
+    daemon.set_defaults(handler=cmd_daemon)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    runner = Runner(args)
+    runner.engine.start()
+    try:
+        return args.handler(runner)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if args.metrics:
+            runner.write_metrics()
+        runner.engine.close()
@@ -0,0 +1,294 @@
+import os
+import re
+import threading
+import time
+from functools import partial
+
+from torro.events import EventBus
+from torro.extract_cache import ExtractionCache, normalize_url
+from torro.history import HistoryDB, Row
+from torro.journal import JobJournal
+from torro.library import DownloadIndex
+from torro.manager import DownloadManager, YT_DLP_AVAILABLE
+from torro.metrics import Metrics
+from torro.ratelimit import RateLimiter
+from torro.storage import STORAGE_MAX_AGE, STORAGE_QUOTA, Storage
+from torro.store import DownloadStore
+
+# --- Files kept in the engine's data directory ---
+HISTORY_DB_NAME = 'history.db'
+JOURNAL_NAME = 'jobs.journal'     # Write-ahead journal used to resume killed downloads
+EXTRACT_CACHE_NAME = 'extract_cache.db'
+EXTRACT_CACHE_TTL = 30 * 60       # Seconds an extraction is reused; format URLs expire
+THUMBNAIL_DIR_NAME = 'thumbnails'
+LIBRARY_NAME = 'library.db'       # Index of finished files, by video id and URL
+
+# --- Bandwidth limits (bytes per second, None for unlimited) ---
+RATE_LIMIT = None
+METERED_RATE_LIMIT = 1024 * 1024  # Mobile data and metered Wi-Fi
+
+# --- Batch input ---
+# URLs may be separated by newlines, spaces, or nothing at all when pasted back to back
+URL_PATTERN = re.compile(r'https?://\S+?(?=https?://|\s|$)')
+
+def parse_urls(text):
+    """ Every URL in a paste or a text file, in order. Lines starting with '#' are skipped. """
+    urls = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            urls.extend(URL_PATTERN.findall(line))
+    return urls
+
+def duration_text(seconds):
+    """ '3:07' or '1:02:03' for a duration in seconds; '' if unknown. """
+    if not seconds:
+        return ''
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+class ProgressBuffer:
+    """ Thread-safe buffer holding only the latest progress per download id.
+
+    yt-dlp can fire its progress hook hundreds of times per second; worker
+    threads push into this buffer and the owner drains it on a fixed tick,
+    so older values for the same download are simply overwritten.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # download id -> (progress, speed)
+        self._events = 0    # hook events pushed since the last drain
+
+    def push(self, download_id, progress, speed):
+        with self._lock:
+            self._pending[download_id] = (progress, speed)
+            self._events += 1
+
+    def discard(self, download_id):
+        """ Drops a pending update, e.g. once the job reached a final status. """
+        with self._lock:
+            self._pending.pop(download_id, None)
+
+    def drain(self):
+        """ Returns (updates, merged_events) and resets the buffer. """
+        with self._lock:
+            pending, events = self._pending, self._events
+            self._pending, self._events = {}, 0
+        return pending, events
+
+class Engine:
+    """ The download engine without any UI: persistence, scheduling and row state.
+
+    Everything that happens to a job is published on ``bus``; subscribers
+    are called on whatever thread emitted the event:
+
+    - ``('added', row)``: a row was created (owner thread)
+    - ``('info', download_id, title, thumbnail_url)``: extraction finished
+    - ``('metadata', download_id, title, thumbnail_url, duration)``: a queued
+      job was extracted ahead of its turn
+    - ``('progress', download_id, percent, speed_text)``: yt-dlp progress
+    - ``('status', download_id, status, message)``: queued, processing, paused,
+      cancelled, completed or error
+    - ``('playlist_entry', parent_id, url, title)``: a playlist yielded an entry
+    - ``('thumbnail', download_id, path)``: the card-sized thumbnail is on disk
+
+    Rows in ``store`` are only ever changed on the owner thread: worker
+    events are handed to ``call_soon(fn, *args)``, which must run ``fn``
+    there later (Kivy's Clock in the app, a queue in the CLI). Progress is
+    coalesced in a ProgressBuffer until the owner calls apply_progress().
+    Job timings and the owner's own costs are collected in ``metrics``, and
+    running jobs share one bandwidth limit through ``limiter`` and set their
+    disk space aside in ``storage``.
+    """
+    def __init__(self, data_dir, call_soon, download_folder=None,
+                 thumbnail_size=None, rate_limit=RATE_LIMIT, metered_rate_limit=METERED_RATE_LIMIT,
+                 storage_quota=STORAGE_QUOTA, storage_max_age=STORAGE_MAX_AGE, **manager_options):
+        os.makedirs(data_dir, exist_ok=True)
+        self.call_soon = call_soon
+        self.bus = EventBus()
+        self.metrics = Metrics()
+        self.rate_limit = rate_limit
+        self.metered_rate_limit = metered_rate_limit
+        self.metered = False
+        self.limiter = RateLimiter(rate_limit)
+        self.progress_buffer = ProgressBuffer()
+        self.history = HistoryDB(os.path.join(data_dir, HISTORY_DB_NAME))
+        self.store = DownloadStore(self.history)
+        self.journal = JobJournal(os.path.join(data_dir, JOURNAL_NAME))
+        self.extract_cache = ExtractionCache(os.path.join(data_dir, EXTRACT_CACHE_NAME),
+                                             ttl=EXTRACT_CACHE_TTL)
+        self.library = DownloadIndex(os.path.join(data_dir, LIBRARY_NAME))
+        self.thumbnails = None
+        if thumbnail_size:
+            # Pillow is only needed when a UI wants thumbnails
+            from torro.thumbnails import ThumbnailCache
+            self.thumbnails = ThumbnailCache(os.path.join(data_dir, THUMBNAIL_DIR_NAME), thumbnail_size)
+        self.storage = Storage(download_folder, library=self.library, quota=storage_quota,
+                               max_age=storage_max_age, metrics=self.metrics)
+        self.manager = DownloadManager(self.bus, journal=self.journal, extract_cache=self.extract_cache,
+                                       library=self.library, storage=self.storage, metrics=self.metrics,
+                                       limiter=self.limiter, **manager_options)
+
+        self.bus.subscribe(self._on_progress, 'progress')
+        self.bus.subscribe(self._on_job_event, 'info', 'metadata', 'status', 'playlist_entry', 'thumbnail')
+
+    def start(self):
+        """ Brings back unfinished jobs. Bind row views to ``store`` before calling this.
+
+        Only unfinished jobs are read at startup; history stays on disk.
+        Interrupted ones are resubmitted and continue from their .part files.
+        """
+        if self.storage.quota is not None or self.storage.max_age is not None:
+            # Stats every finished file, so keep it off the caller's thread
+            threading.Thread(target=self.storage.cleanup, name='torro-cleanup', daemon=True).start()
+        resident = self.store.load_resident()
+        self.journal.retain(row['id'] for row in resident)
+        for row in resident:
+            if row['status'] == 'paused':
+                self.manager.restore_paused(row)
+            else:
+                self.manager.submit(row)
+        return resident
+
+    def close(self):
+        # Running downloads are stopped and queued merges dropped before the stores
+        # close; their rows stay 'downloading' or 'processing' and resume next start
+        self.manager.close()
+        if self.thumbnails:
+            self.thumbnails.shutdown()
+        self.journal.close()
+        self.extract_cache.close()
+        self.library.close()
+        self.history.close()
+
+    # --- Commands (owner thread) ---
+    def add_downloads(self, text, format_options=None):
+        """ Queues every URL in ``text``, except ones already queued or running. Returns how many were queued. """
+        urls = parse_urls(text)
+        if not urls:
+            print("URL cannot be empty")
+            return 0
+        
+        if not YT_DLP_AVAILABLE:
+            print("Cannot start download, yt-dlp is not available.")
+            return 0
+
+        active = {normalize_url(row['url']) for row in self.store.rows()
+                  if row['status'] in ('queued', 'downloading', 'processing', 'paused')}
+        queued = 0
+        for url in urls:
+            key = normalize_url(url)
+            if key in active:
+                print(f"Already in the queue: {url}")
+                continue
+            active.add(key)
+            self.add_download(url, format_options=format_options)
+            queued += 1
+        return queued
+
+    def add_download(self, url, title=None, format_options=None):
+        # format_options are per-job FormatPolicy overrides. Not persisted:
+        # once the job starts, the journal keeps the format it settled on.
+        new_download = Row(url=url, title=title or "Fetching details...", status='queued',
+                           format_options=format_options or None)
+        
+        # Persisted, given an id, and shown at the top of the lists
+        self.store.add(new_download)
+        self.bus.emit('added', new_download)
+        
+        # Hand the job to the scheduler; it stays 'queued' until a worker is free
+        self.manager.submit(new_download)
+        return new_download
+
+    def toggle_pause(self, download_id):
+        """ Pauses a queued/running job, or resumes a paused one. """
+        if not self.manager.pause(download_id):
+            self.manager.resume(download_id)
+
+    def cancel(self, download_id):
+        self.manager.cancel(download_id)
+
+    def set_metered(self, metered):
+        """ Switches between the normal and the metered-network bandwidth limit. """
+        if metered == self.metered:
+            return
+        self.metered = metered
+        rate = self.metered_rate_limit if metered else self.rate_limit
+        self.limiter.set_rate(rate)
+        self.metrics.set_gauge('rate_limit_bytes_per_second', rate or 0)
+        print(f"{'Metered' if metered else 'Unmetered'} network, rate limit "
+              f"{f'{rate / 1024 / 1024:.2f} MB/s' if rate else 'off'}")
+
+    def set_foreground(self, download_id):
+        """ Puts a job in the foreground bandwidth lane; None clears it. """
+        self.limiter.set_foreground(download_id)
+
+    def set_weight(self, download_id, weight):
+        return self.manager.set_weight(download_id, weight)
+
+    def pending_count(self):
+        """ Jobs that are queued, running or merging, i.e. not paused, failed or done. """
+        return sum(1 for row in self.store.rows() if row['status'] in ('queued', 'downloading', 'processing'))
+
+    def apply_progress(self):
+        """ Applies every buffered progress update in one batch. Returns the merged hook count. """
+        started = time.perf_counter()
+        updates, merged = self.progress_buffer.drain()
+        for download_id, (progress, speed) in updates.items():
+            self.store.update(download_id, progress=progress, speed=speed)
+        if updates:
+            self.metrics.observe('progress_apply_seconds', time.perf_counter() - started)
+            self.metrics.inc('progress_rows_applied', len(updates))
+            self.metrics.observe('progress_events_merged', merged)  # Hook calls folded into this tick
+        return merged
+
+    # --- Event handling ---
+    def _on_progress(self, event, download_id, progress, speed):
+        self.progress_buffer.push(download_id, progress, speed)
+
+    def _on_job_event(self, event, *args):
+        self.call_soon(getattr(self, '_apply_' + event), *args)
+
+    def _apply_info(self, download_id, title, thumbnail):
+        self.store.update(download_id, title=title, status='downloading')
+        if self.thumbnails and thumbnail:
+            # The row only ever points at the local, card-sized copy
+            self.thumbnails.fetch(thumbnail, partial(self._on_thumbnail_cached, download_id))
+
+    def _apply_metadata(self, download_id, title, thumbnail, duration):
+        row = self.store.get(download_id)
+        if row is None or row['status'] != 'queued':
+            return  # Its worker got there first and reports the details itself
+        # Until the job starts, its speed label shows the length instead
+        self.store.update(download_id, title=title, speed=duration_text(duration))
+        if self.thumbnails and thumbnail:
+            self.thumbnails.fetch(thumbnail, partial(self._on_thumbnail_cached, download_id))
+
+    def _on_thumbnail_cached(self, download_id, path):
+        if path:
+            self.bus.emit('thumbnail', download_id, path)
+
+    def _apply_thumbnail(self, download_id, path):
+        if self.store.update(download_id, thumbnail=path) is None:
+            # The job already finished and left memory (playlist entries always
+            # have); fix its history row and any copy of it that is on screen
+            self.store.update_stored(download_id, thumbnail=path)
+
+    def _apply_status(self, download_id, status, message):
+        # Progress buffered before this status change must not overwrite it
+        self.progress_buffer.discard(download_id)
+        fields = {'status': status}
+        if status == 'completed':
+            fields.update(progress=100, speed='✅')
+        elif status == 'processing':
+            fields.update(progress=0, speed='Merging…')
+        elif status == 'error':
+            fields.update(speed='❌', title=f"Error: {message}")
+        elif status in ('paused', 'cancelled', 'queued'):
+            fields['speed'] = message if status == 'queued' else ''  # e.g. "Retry 2 in 8s"
+        self.store.update(download_id, **fields)
+
+    def _apply_playlist_entry(self, parent_id, url, title):
+        parent = self.store.get(parent_id)
+        self.add_download(url, title, format_options=parent.get('format_options') if parent else None)
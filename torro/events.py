@@ -0,0 +1,31 @@
+import threading
+
+class EventBus:
+    """ Minimal thread-safe publish/subscribe hub.
+
+    Subscribers are called synchronously on the emitting thread as
+    ``callback(event, *args)``, so anything that must run on a particular
+    thread (a UI, a CLI loop) has to marshal the call itself. Subscribing
+    without event names receives every event.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []  # (callback, frozenset of events or None)
+
+    def subscribe(self, callback, *events):
+        with self._lock:
+            self._subscribers = self._subscribers + [(callback, frozenset(events) or None)]
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [entry for entry in self._subscribers if entry[0] is not callback]
+
+    def emit(self, event, *args):
+        # Copy-on-write list: emitting never takes the lock on the hot path
+        for callback, events in self._subscribers:
+            if events is None or event in events:
+                try:
+                    callback(event, *args)
+                except Exception as e:
+                    print(f"Error in {event!r} subscriber {callback!r}: {e}")
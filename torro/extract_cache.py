@@ -0,0 +1,142 @@
+import copy
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that never change what a URL points to.
+TRACKING_PARAMS = {'si', 'feature', 'fbclid', 'gclid', 'igshid', 'ref', 'ref_src', 'pp'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    key         TEXT PRIMARY KEY,
+    info        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    last_used   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_extractions_last_used ON extractions(last_used);
+"""
+
+def normalize_url(url):
+    """ Canonical cache key for a URL: same video, same key.
+
+    Lowercases the scheme and host, drops fragments and tracking parameters,
+    sorts the query, and folds the common YouTube short and mobile forms
+    into the watch URL.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    path = parts.path.rstrip('/') or '/'
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key not in TRACKING_PARAMS and not key.startswith('utm_')]
+
+    if host in ('m.youtube.com', 'youtube.com', 'music.youtube.com'):
+        host = 'www.youtube.com'
+    if host == 'youtu.be' and path != '/':
+        host, query = 'www.youtube.com', [('v', path.lstrip('/'))] + query
+        path = '/watch'
+    elif host == 'www.youtube.com' and path.startswith('/shorts/'):
+        query = [('v', path[len('/shorts/'):])] + query
+        path = '/watch'
+
+    netloc = host if not parts.port else f"{host}:{parts.port}"
+    return urlunsplit(((parts.scheme or 'https').lower(), netloc, path, urlencode(sorted(query)), ''))
+
+class ExtractionCache:
+    """ Cache of yt-dlp info dicts, keyed by normalized URL.
+
+    A small in-memory LRU sits in front of an SQLite store. Entries expire
+    after ``ttl`` seconds, since the format URLs inside an info dict are
+    usually signed and stop working after a while, and the store is trimmed
+    back to ``max_entries`` / ``max_bytes`` by least recent use. Stored info
+    dicts must be JSON-serializable (see ``YoutubeDL.sanitize_info``); callers
+    get their own copy, since yt-dlp mutates info dicts while downloading.
+    """
+    def __init__(self, path, ttl=30 * 60, max_entries=500, max_bytes=64 * 1024 * 1024,
+                 memory_entries=32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # key -> (created_at, info)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            self._conn.execute("DELETE FROM extractions WHERE created_at < ?", (time.time() - ttl,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, url):
+        """ The cached info dict for ``url``, or None if missing or expired. """
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._memory.move_to_end(key)
+                    return copy.deepcopy(entry[1])
+                del self._memory[key]
+
+            record = self._conn.execute(
+                "SELECT info, created_at FROM extractions WHERE key = ?", (key,)).fetchone()
+            if record is None:
+                return None
+            if now - record[1] >= self.ttl:
+                with self._conn:
+                    self._conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE extractions SET last_used = ? WHERE key = ?", (now, key))
+            info = json.loads(record[0])
+            self._remember(key, record[1], info)
+            return copy.deepcopy(info)
+
+    def put(self, url, info):
+        key = normalize_url(url)
+        now = time.time()
+        blob = json.dumps(info)
+        with self._lock:
+            self._remember(key, now, copy.deepcopy(info))
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO extractions (key, info, size, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)", (key, blob, len(blob), now, now))
+                self._trim()
+
+    def discard(self, url):
+        """ Forgets ``url``, e.g. after its cached format URLs failed to download. """
+        key = normalize_url(url)
+        with self._lock:
+            self._memory.pop(key, None)
+            with self._conn:
+                self._conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+
+    def _remember(self, key, created_at, info):
+        """ Caller must hold self._lock. """
+        self._memory[key] = (created_at, info)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _trim(self):
+        """ Evicts least recently used rows over the caps. Caller must hold self._lock. """
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM extractions ORDER BY last_used"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM extractions WHERE key = ?", evicted)
+        for (key,) in evicted:
+            self._memory.pop(key, None)
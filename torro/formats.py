@@ -0,0 +1,131 @@
+import shutil
+
+MAX_DOWNLOAD_SECONDS = 15 * 60        # Aim to finish within this at the measured throughput
+STORAGE_RESERVE = 512 * 1024 * 1024   # Free space to leave on the device after the download
+PROGRESSIVE_MIN_HEIGHT = 720          # A single-file format this tall (or the cap) beats any merge
+PREFERRED_VIDEO_EXTS = ('mp4',)       # Plays everywhere; webm/av1 often decode in software on phones
+PREFERRED_AUDIO_EXTS = ('m4a',)
+
+class FormatPolicy:
+    """ Picks what to download from an extracted video's ``formats``.
+
+    Candidates are every progressive (audio+video) format and, if merging
+    is allowed, the best video-only format of each height paired with the
+    best audio. Candidates taller than ``max_height`` or the screen, bigger
+    than the free storage minus STORAGE_RESERVE, or slower than
+    MAX_DOWNLOAD_SECONDS at the measured throughput are dropped, and the
+    tallest survivor wins. A progressive format reaching PROGRESSIVE_MIN_HEIGHT
+    (or the cap, if lower) is taken over any merge, since it needs no
+    ffmpeg pass. If nothing fits, the smallest candidate is used.
+
+    Per-job overrides are plain dicts with any of the constructor's
+    arguments, plus 'format' for a literal yt-dlp format spec.
+    """
+    def __init__(self, max_height=None, screen_height=None, allow_merge=True, prefer_progressive=True,
+                 audio_only=False, max_seconds=MAX_DOWNLOAD_SECONDS, storage_reserve=STORAGE_RESERVE):
+        self.max_height = max_height
+        self.screen_height = screen_height
+        self.allow_merge = allow_merge
+        self.prefer_progressive = prefer_progressive
+        self.audio_only = audio_only
+        self.max_seconds = max_seconds
+        self.storage_reserve = storage_reserve
+
+    def with_overrides(self, overrides):
+        """ A copy of this policy with a job's overrides applied ('format' is handled by the caller). """
+        options = dict(vars(self))
+        options.update((key, value) for key, value in (overrides or {}).items() if key in options)
+        return FormatPolicy(**options)
+
+    @property
+    def height_cap(self):
+        caps = [cap for cap in (self.max_height, self.screen_height) if cap]
+        return min(caps) if caps else None
+
+    def choose(self, info, throughput=None, free_bytes=None):
+        """ yt-dlp format spec for ``info`` (e.g. '22' or '137+140'), or None to keep yt-dlp's choice. """
+        formats = [f for f in info.get('formats') or [] if f.get('format_id') and f.get('url')]
+        if not formats:
+            return None
+        duration = info.get('duration')
+        audio = sorted((f for f in formats if _is_audio_only(f)), key=_audio_rank, reverse=True)
+        if self.audio_only:
+            return audio[0]['format_id'] if audio else None
+
+        candidates = []  # (format spec, height, estimated size, needs merge, preferred ext)
+        for f in formats:
+            if _is_progressive(f) and f.get('height'):
+                candidates.append((f['format_id'], f['height'], _size(f, duration), False,
+                                   f.get('ext') in PREFERRED_VIDEO_EXTS))
+        if self.allow_merge and audio:
+            best_audio = audio[0]
+            for f in formats:
+                if _is_video_only(f) and f.get('height'):
+                    size = _size(f, duration)
+                    audio_size = _size(best_audio, duration)
+                    candidates.append((f"{f['format_id']}+{best_audio['format_id']}", f['height'],
+                                       size + audio_size if size and audio_size else None, True,
+                                       f.get('ext') in PREFERRED_VIDEO_EXTS))
+        if not candidates:
+            return None
+
+        cap = self.height_cap
+        fitting = [c for c in candidates if self._fits(c, cap, throughput, free_bytes)]
+        if not fitting:
+            # Nothing fits every budget: take the smallest thing there is
+            sized = [c for c in candidates if c[2]] or candidates
+            return min(sized, key=lambda c: (c[2] or 0, c[1]))[0]
+
+        if self.prefer_progressive:
+            progressive = [c for c in fitting if not c[3]]
+            enough = min(PROGRESSIVE_MIN_HEIGHT, cap) if cap else PROGRESSIVE_MIN_HEIGHT
+            best_progressive = max(progressive, key=_rank, default=None)
+            if best_progressive and best_progressive[1] >= enough:
+                return best_progressive[0]
+        return max(fitting, key=_rank)[0]
+
+    def _fits(self, candidate, cap, throughput, free_bytes):
+        spec, height, size, merge, preferred = candidate
+        if cap and height > cap:
+            return False
+        if size and free_bytes is not None and size > free_bytes - self.storage_reserve:
+            return False
+        if size and throughput and size / throughput > self.max_seconds:
+            return False
+        return True
+
+def free_space(path):
+    """ Free bytes on the volume holding ``path``, or None if unknown. """
+    try:
+        return shutil.disk_usage(path).free
+    except OSError:
+        return None
+
+def estimated_size(info):
+    """ Bytes a processed info dict will download, summed over its requested formats, or None if unknown. """
+    sizes = [_size(f, info.get('duration')) for f in info.get('requested_formats') or [info]]
+    return sum(sizes) if all(sizes) else None
+
+def _rank(candidate):
+    spec, height, size, merge, preferred = candidate
+    # Taller first, then a device-friendly container, then no merge, then smaller
+    return (height, preferred, not merge, -(size or 0))
+
+def _audio_rank(f):
+    return (f.get('ext') in PREFERRED_AUDIO_EXTS, f.get('abr') or f.get('tbr') or 0)
+
+def _is_progressive(f):
+    return f.get('vcodec') not in (None, 'none') and f.get('acodec') not in (None, 'none')
+
+def _is_video_only(f):
+    return f.get('vcodec') not in (None, 'none') and f.get('acodec') == 'none'
+
+def _is_audio_only(f):
+    return f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')
+
+def _size(f, duration):
+    """ Size in bytes from the format, or estimated from its bitrate (kbit/s) and the duration. """
+    size = f.get('filesize') or f.get('filesize_approx')
+    if not size and f.get('tbr') and duration:
+        size = f['tbr'] * 1000 / 8 * duration
+    return size
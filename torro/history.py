@@ -0,0 +1,170 @@
+import sqlite3
+import sys
+import threading
+import time
+
+# Columns stored for every download row, in table order (after the id).
+ROW_FIELDS = ('url', 'title', 'thumbnail', 'status', 'progress', 'speed')
+ROW_DEFAULTS = {'url': '', 'title': '', 'thumbnail': '', 'status': 'queued', 'progress': 0, 'speed': ''}
+ROW_KEYS = frozenset(('id', 'format_options') + ROW_FIELDS)
+
+class Row:
+    """ One download row.
+
+    A slotted record rather than a dict: about a third of the memory, which
+    adds up over a long history. It keeps the part of the dict interface
+    that the engine and Kivy's RecycleView use (``row['title']``, ``get``,
+    ``update``, ``keys``/``items``), so it still serves as RecycleView data.
+    ``version`` counts updates and ``changed`` names the fields of the
+    latest one, so a view can apply just those; see torro.store.apply_row.
+    """
+    __slots__ = ('id',) + ROW_FIELDS + ('format_options', 'version', 'changed')
+
+    def __init__(self, id=None, format_options=None, **fields):
+        self.id = id
+        for key in ROW_FIELDS:
+            setattr(self, key, fields.pop(key, ROW_DEFAULTS[key]))
+        if fields:
+            raise TypeError(f"Unknown row fields: {', '.join(fields)}")
+        self.format_options = format_options  # Per-job FormatPolicy overrides, never stored
+        self.version = 0
+        self.changed = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def __contains__(self, key):
+        return key in ROW_KEYS and (key != 'format_options' or self.format_options is not None)
+
+    def __repr__(self):
+        return f"Row({', '.join(f'{key}={value!r}' for key, value in self.items())})"
+
+    def get(self, key, default=None):
+        # RecycleView asks every item for its sizing keys on each layout pass
+        return getattr(self, key) if key in ROW_KEYS else default
+
+    def keys(self):
+        return ('id',) + ROW_FIELDS + (('format_options',) if self.format_options is not None else ())
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def update(self, fields=(), **kwargs):
+        fields = dict(fields, **kwargs)
+        for key, value in fields.items():
+            setattr(self, key, value)
+        self.version += 1
+        self.changed = tuple(fields)
+
+    def changed_since(self, version):
+        """ Fields updated since ``version``: () if none, None if more than the latest update could tell. """
+        if version == self.version:
+            return ()
+        if version == self.version - 1:
+            return self.changed
+        return None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    url         TEXT NOT NULL,
+    title       TEXT NOT NULL DEFAULT '',
+    thumbnail   TEXT NOT NULL DEFAULT '',
+    status      TEXT NOT NULL,
+    progress    REAL NOT NULL DEFAULT 0,
+    speed       TEXT NOT NULL DEFAULT '',
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_downloads_status ON downloads(status);
+CREATE INDEX IF NOT EXISTS idx_downloads_created_at ON downloads(created_at);
+"""
+
+class HistoryDB:
+    """ On-disk download history backed by SQLite.
+
+    Row ids come from the table's AUTOINCREMENT key, so they are stable
+    across restarts and larger ids are always newer. Rows are handed out
+    as Row records with a string 'id', the shape the RecycleViews use.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            # WAL keeps row updates cheap and readers unblocked while a job writes.
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_row(record):
+        row = Row(str(record['id']), **{key: record[key] for key in ROW_FIELDS})
+        # A handful of values repeat across the whole history; keep one copy of each
+        row.status = sys.intern(row.status)
+        row.speed = sys.intern(row.speed)
+        return row
+
+    def insert(self, row):
+        """ Stores a new row and returns its id as a string. """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"INSERT INTO downloads ({', '.join(ROW_FIELDS)}, created_at, updated_at) "
+                f"VALUES ({', '.join('?' * len(ROW_FIELDS))}, ?, ?)",
+                [row.get(key, ROW_DEFAULTS[key]) for key in ROW_FIELDS] + [now, now],
+            )
+        return str(cursor.lastrowid)
+
+    def update(self, download_id, **fields):
+        """ Writes the given columns for one row. Unknown keys are ignored. """
+        columns = [key for key in fields if key in ROW_FIELDS]
+        if not columns:
+            return
+        assignments = ', '.join(f"{key} = ?" for key in columns)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE downloads SET {assignments}, updated_at = ? WHERE id = ?",
+                [fields[key] for key in columns] + [time.time(), int(download_id)],
+            )
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+
+    def with_status(self, statuses):
+        """ Rows whose status is in ``statuses``, newest first. Uses the status index. """
+        placeholders = ', '.join('?' * len(statuses))
+        with self._lock:
+            records = self._conn.execute(
+                f"SELECT * FROM downloads WHERE status IN ({placeholders}) ORDER BY id DESC",
+                list(statuses),
+            ).fetchall()
+        return [self._to_row(record) for record in records]
+
+    def page(self, before_id=None, limit=50):
+        """ Up to ``limit`` rows older than ``before_id`` (or the newest ones), newest first.
+
+        Keyset pagination on the primary key, so every page costs the same
+        no matter how deep into the history the user has scrolled.
+        """
+        with self._lock:
+            if before_id is None:
+                records = self._conn.execute(
+                    "SELECT * FROM downloads ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                records = self._conn.execute(
+                    "SELECT * FROM downloads WHERE id < ? ORDER BY id DESC LIMIT ?",
+                    (int(before_id), limit)).fetchall()
+        return [self._to_row(record) for record in records]
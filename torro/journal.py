@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+import time
+
+# Progress is journaled per job only once both of these have passed since the last record.
+PROGRESS_MIN_BYTES = 1024 * 1024
+PROGRESS_MIN_SECONDS = 2.0
+
+class JobJournal:
+    """ Crash-safe, append-only journal of jobs that have started downloading.
+
+    Each start and finish record is flushed and fsynced before the call
+    returns, so a job killed at any point can be picked up again from the
+    URL, format and output path it was started with. Progress records are
+    only flushed: resuming trusts the .part file's size, and the offset is
+    just an estimate, so losing the last few costs nothing.
+
+    Each line is one JSON record:
+
+    - ``{"op": "start", "id", "url", "format", "filename"}``
+    - ``{"op": "progress", "id", "offset"}``
+    - ``{"op": "finish", "id"}``
+
+    Replaying the file yields the jobs that never finished. The file is
+    compacted down to those jobs every time it is opened.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._jobs = self._replay()
+        self._last_progress = {}  # job id -> (offset, time) of the last progress record
+        self._compact()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _replay(self):
+        jobs = {}
+        if not os.path.exists(self.path):
+            return jobs
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn last line from a crash mid-write
+                op = record.pop('op', None)
+                job_id = record.get('id')
+                if op == 'start':
+                    jobs[job_id] = dict({'offset': 0}, **record)
+                elif op == 'progress' and job_id in jobs:
+                    jobs[job_id]['offset'] = record['offset']
+                elif op == 'finish':
+                    jobs.pop(job_id, None)
+        return jobs
+
+    def _compact(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for job in self._jobs.values():
+                f.write(json.dumps(dict(job, op='start')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _append(self, record, sync=True):
+        """ Writes one record, durably unless ``sync`` is False. Caller must hold self._lock. """
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    # --- Queries ---
+    def get(self, job_id):
+        """ The journaled state of an unfinished job, or None. """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def pending(self):
+        """ All unfinished jobs, keyed by id. """
+        with self._lock:
+            return {job_id: dict(job) for job_id, job in self._jobs.items()}
+
+    # --- Writes ---
+    def start(self, job_id, url, format_id, filename):
+        """ Records the choices a resumed job must repeat to find its .part file. """
+        with self._lock:
+            job = {'id': job_id, 'url': url, 'format': format_id, 'filename': filename}
+            self._jobs[job_id] = dict(job, offset=0)
+            self._append(dict(job, op='start'))
+
+    def progress(self, job_id, offset):
+        """ Records the byte offset reached, throttled per job. """
+        now = time.monotonic()
+        with self._lock:
+            if job_id not in self._jobs:
+                return
+            last_offset, last_time = self._last_progress.get(job_id, (0, 0.0))
+            if offset - last_offset < PROGRESS_MIN_BYTES or now - last_time < PROGRESS_MIN_SECONDS:
+                return
+            self._last_progress[job_id] = (offset, now)
+            self._jobs[job_id]['offset'] = offset
+            self._append({'op': 'progress', 'id': job_id, 'offset': offset}, sync=False)
+
+    def finish(self, job_id):
+        """ Drops a job that completed, failed or was cancelled. """
+        with self._lock:
+            self._last_progress.pop(job_id, None)
+            if self._jobs.pop(job_id, None) is not None:
+                self._append({'op': 'finish', 'id': job_id})
+
+    def retain(self, job_ids):
+        """ Drops every journaled job whose id is not in ``job_ids``. """
+        for job_id in set(self.pending()) - set(job_ids):
+            self.finish(job_id)
+
+def resume_options(job):
+    """ yt-dlp options that make a journaled job continue its existing .part file. """
+    return {
+        'format': job['format'],
+        # The filename is already resolved; escape it so it is not re-templated
+        'outtmpl': job['filename'].replace('%', '%%'),
+        'continuedl': True,
+    }
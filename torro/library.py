@@ -0,0 +1,181 @@
+import errno
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from torro.extract_cache import normalize_url
+
+HASH_CHUNK = 1024 * 1024
+FICLONE = 0x40049409  # Linux ioctl: share a file's extents copy-on-write (btrfs, XFS, ...)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    video_key   TEXT PRIMARY KEY,
+    path        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime       REAL NOT NULL,
+    sha256      TEXT,
+    title       TEXT NOT NULL DEFAULT '',
+    format_id   TEXT,
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_size ON files(size);
+CREATE TABLE IF NOT EXISTS urls (
+    url_key     TEXT PRIMARY KEY,
+    video_key   TEXT NOT NULL
+);
+"""
+
+def video_key(info):
+    """ Canonical id of the video behind an info dict, e.g. 'Youtube:dQw4w9WgXcQ', or None. """
+    extractor = info.get('extractor_key') or info.get('ie_key') or info.get('extractor')
+    video_id = info.get('id')
+    return f"{extractor}:{video_id}" if extractor and video_id else None
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def link_identical(source, target):
+    """ Replaces ``target`` with a reflink or, failing that, a hardlink of ``source``.
+
+    Both files must already hold the same bytes. Returns 'reflink',
+    'hardlink', or None if the filesystem supports neither (``target`` is
+    then left alone).
+    """
+    tmp_path = f"{target}.{threading.get_ident()}.link"
+    try:
+        import fcntl
+        with open(source, 'rb') as src, open(tmp_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        os.replace(tmp_path, target)
+        return 'reflink'
+    except (ImportError, OSError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    try:
+        os.link(source, tmp_path)
+        os.replace(tmp_path, target)
+        return 'hardlink'
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EEXIST):
+            print(f"Cannot link {target} to {source}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+class DownloadIndex:
+    """ Index of finished downloads, by canonical video id and by URL.
+
+    ``find_url`` answers "do we already have this?" for a pasted URL
+    without any network access; ``find_video`` does the same for an
+    extracted video, which catches different URLs of the same video.
+    Entries are checked against the file on disk (same size and mtime)
+    whenever they are read, and dropped once the file is gone or changed.
+    """
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def find_url(self, url):
+        with self._lock:
+            record = self._conn.execute(
+                "SELECT files.* FROM urls JOIN files USING (video_key) WHERE urls.url_key = ?",
+                (normalize_url(url),)).fetchone()
+            return self._checked(record)
+
+    def find_video(self, key):
+        with self._lock:
+            record = self._conn.execute("SELECT * FROM files WHERE video_key = ?", (key,)).fetchone()
+            return self._checked(record)
+
+    def add_url(self, url, key):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO urls (url_key, video_key) VALUES (?, ?)",
+                               (normalize_url(url), key))
+
+    def record(self, url, key, path, title='', format_id=None):
+        """ Adds a finished file, returning its entry. """
+        stat = os.stat(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (video_key, path, size, mtime, sha256, title, format_id, created_at) "
+                "VALUES (?, ?, ?, ?, NULL, ?, ?, ?)",
+                (key, path, stat.st_size, stat.st_mtime, title, format_id, time.time()))
+            self._conn.execute("INSERT OR REPLACE INTO urls (url_key, video_key) VALUES (?, ?)",
+                               (normalize_url(url), key))
+        return {'video_key': key, 'path': path, 'size': stat.st_size, 'title': title}
+
+    def entries(self):
+        """ Every indexed file still on disk. """
+        with self._lock:
+            records = self._conn.execute("SELECT * FROM files").fetchall()
+            return [entry for entry in map(self._checked, records) if entry]
+
+    def remove(self, key):
+        """ Forgets ``key`` and its URLs; the file itself is the caller's business. """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE video_key = ?", (key,))
+            self._conn.execute("DELETE FROM urls WHERE video_key = ?", (key,))
+
+    def find_identical(self, key):
+        """ Path of another indexed file with exactly the same bytes as ``key``'s, or None.
+
+        Only files of the same size are hashed, and each hash is stored, so
+        this is nearly free unless a size actually collides.
+        """
+        entry = self.find_video(key)
+        if entry is None:
+            return None
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT * FROM files WHERE size = ? AND video_key != ?", (entry['size'], key)).fetchall()
+        candidates = [candidate for candidate in candidates
+                      if self._checked_unlocked(candidate) and candidate['path'] != entry['path']]
+        if not candidates:
+            return None
+        digest = self._digest(entry)
+        for candidate in candidates:
+            if self._digest(candidate) == digest:
+                return candidate['path']
+        return None
+
+    def _digest(self, entry):
+        if entry['sha256']:
+            return entry['sha256']
+        digest = file_digest(entry['path'])
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE files SET sha256 = ? WHERE video_key = ?", (digest, entry['video_key']))
+        return digest
+
+    def _checked_unlocked(self, record):
+        with self._lock:
+            return self._checked(record)
+
+    def _checked(self, record):
+        """ The record as a dict if its file is unchanged on disk. Caller must hold self._lock. """
+        if record is None:
+            return None
+        try:
+            stat = os.stat(record['path'])
+            if stat.st_size == record['size'] and stat.st_mtime == record['mtime']:
+                return dict(record)
+        except OSError:
+            pass
+        with self._conn:
+            self._conn.execute("DELETE FROM files WHERE video_key = ?", (record['video_key'],))
+            self._conn.execute("DELETE FROM urls WHERE video_key = ?", (record['video_key'],))
+        return None
@@ -0,0 +1,842 @@
+import glob
+import heapq
+import importlib.util
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from functools import partial
+from urllib.parse import urlparse
+
+from torro.formats import FormatPolicy, estimated_size
+from torro.journal import resume_options
+from torro.library import link_identical, video_key
+from torro.metrics import Metrics
+from torro.postprocess import MergePool
+from torro.ratelimit import RateLimiter
+from torro.retry import CircuitBreaker, RetryPolicy, classify, error_message, retry_after
+from torro.segmented import SegmentedDownload, SegmentedUnsupported
+from torro.storage import MERGE_SPACE_FACTOR, Storage
+
+# --- yt-dlp is imported lazily ---
+# Importing it loads hundreds of extractor modules, which is most of a cold
+# start on a slow phone; only check that it is installed until it is needed.
+YT_DLP_AVAILABLE = importlib.util.find_spec('yt_dlp') is not None
+if not YT_DLP_AVAILABLE:
+    print("WARNING: yt-dlp not found. Install with: pip install yt-dlp")
+yt_dlp = None  # The module, once load_yt_dlp() has run
+
+def load_yt_dlp():
+    """ Imports yt-dlp on first use and returns it. Safe to call from any thread. """
+    global yt_dlp
+    if yt_dlp is None:
+        import yt_dlp as module
+        yt_dlp = module
+    return yt_dlp
+
+def preload_yt_dlp(callback=None):
+    """ Imports yt-dlp on a background thread, then calls ``callback()`` there.
+
+    Workers import it themselves on their first job; this only lets that
+    cost overlap with the user pasting a URL instead of following it.
+    """
+    def run():
+        try:
+            load_yt_dlp()
+        except Exception as e:
+            print(f"Cannot import yt-dlp: {e}")
+            return
+        if callback:
+            callback()
+    if YT_DLP_AVAILABLE:
+        threading.Thread(target=run, name='torro-import-yt-dlp', daemon=True).start()
+
+# --- Download scheduler limits ---
+MAX_CONCURRENT_DOWNLOADS = 3  # Worker threads running yt-dlp at once
+MAX_DOWNLOADS_PER_HOST = 2    # Parallel jobs allowed against a single host
+SEGMENTED_DOWNLOAD_SEGMENTS = 0  # Parallel byte ranges per progressive HTTP file; 0 or 1 = off
+MAX_PREFETCH_WORKERS = 2      # Extractions run ahead of the queue; few, so they never crowd out transfers
+CLOSE_TIMEOUT = 5.0           # Seconds close() waits for running jobs to stop
+PREFETCH_AHEAD = 6            # Queued jobs extracted ahead; few enough to outlive the cache's LRU and TTL
+
+OUTPUT_TEMPLATE = '%(title)s [%(height)sp] [%(id)s].%(ext)s'  # The id keeps same-titled videos apart
+DEFAULT_FORMAT = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+DEDUP_LINK_IDENTICAL = True  # Reflink/hardlink a new file to an indexed one with the same bytes
+PLAYLIST_TYPES = ('playlist', 'multi_video')
+
+class DownloadManager:
+    """ Schedules yt-dlp downloads on a bounded pool of worker threads.
+
+    Jobs wait in a priority FIFO queue (lower priority values run first,
+    ties run in submission order) and are handed to a fixed number of
+    workers, with an extra cap on how many jobs may hit the same host at
+    once. Each job can be paused, resumed or cancelled by id.
+
+    The next ``prefetch_ahead`` queued jobs are extracted ahead of their
+    turn by a small prefetch lane (``prefetch_workers`` threads) into
+    ``extract_cache``, which reports each job's title, thumbnail and
+    duration early and lets the worker go straight to the transfer. The
+    window is refilled as workers take jobs, so a long queue never pushes
+    the infos it is about to need out of the cache.
+
+    The manager never touches rows or UI; it reports everything through
+    ``bus`` (see torro.engine for the event list), mostly from worker threads.
+    """
+    def __init__(self, bus, journal=None, extract_cache=None, library=None, download_folder=None,
+                 max_workers=MAX_CONCURRENT_DOWNLOADS, max_per_host=MAX_DOWNLOADS_PER_HOST,
+                 segments=SEGMENTED_DOWNLOAD_SEGMENTS, metrics=None, limiter=None, format_policy=None,
+                 merger=None, storage=None, retry_policy=None, breaker=None,
+                 prefetch_workers=MAX_PREFETCH_WORKERS, prefetch_ahead=PREFETCH_AHEAD):
+        self.bus = bus
+        self.metrics = metrics or Metrics()
+        self.limiter = limiter or RateLimiter()
+        self.format_policy = format_policy or FormatPolicy()
+        self.merger = merger or MergePool()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.segments = segments
+        self.journal = journal
+        self.extract_cache = extract_cache
+        self.library = library
+        # Everything is written straight into the download folder, never copied there
+        self.storage = storage or Storage(download_folder, library=library, metrics=self.metrics)
+        self.download_folder = self.storage.root
+
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self._cond = threading.Condition()
+        self._queue = []          # heap of (priority, seq, download_item)
+        self._seq = itertools.count()
+        self._queued_seq = {}     # download id -> seq of its live queue entry
+        self._priorities = {}     # download id -> priority it was submitted with
+        self._items = {}          # download id -> download_item, kept while paused
+        self._job_state = {}      # download id -> 'queued' | 'running' | 'paused' | 'cancelled'
+        self._weights = {}        # download id -> bandwidth weight, if not the default
+        self._claims = {}         # video key -> id of the job downloading it
+        self._attempts = {}       # download id -> retries so far
+        self._not_before = {}     # download id -> monotonic time its retry may start
+        self._wake_at = None      # earliest time a job skipped by _next_job becomes runnable
+        self._stopping = set()    # ids to stop from progress_hook: a sibling stream failed, or closing
+        self._closing = False
+        self._prefetches = {}     # download id -> Future of its metadata prefetch, for the next few jobs
+        self.prefetch_ahead = prefetch_ahead
+        self._prefetch_local = threading.local()  # One YoutubeDL per prefetch thread
+        self._playlists = {}      # download id -> playlist info a prefetch extracted, for its worker
+        self._prefetcher = None
+        if prefetch_workers and extract_cache is not None:
+            self._prefetcher = ThreadPoolExecutor(max_workers=prefetch_workers,
+                                                  thread_name_prefix='torro-prefetch')
+        self._progress_lock = threading.Lock()
+        self._stream_progress = {}  # download id -> {file: (downloaded, total, speed)} while fetching
+        self._running = set()
+        self._host_active = {}
+
+        for i in range(self.max_workers):
+            threading.Thread(target=self._worker_loop, name=f"torro-worker-{i}", daemon=True).start()
+
+    # --- Scheduling ---
+    def submit(self, download_item, priority=0):
+        """ Adds a job to the queue. Lower priority values are started first. """
+        with self._cond:
+            self._priorities[download_item['id']] = priority
+            self._enqueue(download_item)
+            self._fill_prefetches()
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """ Stops running jobs, waiting up to ``timeout`` seconds for them, and drops pending prefetches and merges.
+
+        No further jobs start. Stopped jobs keep their journal entry and
+        .part files, so they resume on the next start; a running merge or
+        prefetch finishes on its own.
+        """
+        if self._prefetcher:
+            self._prefetcher.shutdown(wait=False, cancel_futures=True)
+        self.merger.shutdown()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._closing = True
+            self._stopping.update(self._running)
+            self._cond.notify_all()
+            while self._running and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+
+    def restore_paused(self, download_item):
+        """ Registers a job from a previous session as paused, so it can be resumed. """
+        with self._cond:
+            self._priorities[download_item['id']] = 0
+            self._items[download_item['id']] = download_item
+            self._job_state[download_item['id']] = 'paused'
+
+    def pause(self, download_id):
+        """ Pauses a queued or running job. Running jobs keep their .part file. """
+        with self._cond:
+            state = self._job_state.get(download_id)
+            if state not in ('queued', 'running'):
+                return False
+            self._job_state[download_id] = 'paused'
+            self._queued_seq.pop(download_id, None)
+            self._drop_prefetch(download_id)
+        if state == 'queued':
+            self.bus.emit('status', download_id, 'paused', '')
+        # Running jobs are stopped from inside progress_hook.
+        return True
+
+    def resume(self, download_id):
+        """ Puts a paused job back in the queue, where yt-dlp continues its .part file. """
+        with self._cond:
+            if self._job_state.get(download_id) != 'paused':
+                return False
+            if download_id in self._running:
+                # Paused before the worker noticed; just keep it going.
+                self._job_state[download_id] = 'running'
+                return True
+            item = self._items[download_id]
+            self._not_before.pop(download_id, None)  # The user asked for it now
+            self._enqueue(item)
+            self._fill_prefetches()
+        self.bus.emit('status', download_id, 'queued', '')
+        return True
+
+    def cancel(self, download_id):
+        """ Drops a job from the queue, or stops it if it is already running, and deletes its partial files. """
+        with self._cond:
+            state = self._job_state.get(download_id)
+            if state not in ('queued', 'running', 'paused'):
+                return False
+            self._queued_seq.pop(download_id, None)
+            if download_id in self._running:
+                # progress_hook stops it and run_download reports the status.
+                self._job_state[download_id] = 'cancelled'
+                return True
+            self._forget(download_id)
+        self._discard_partial(download_id)  # A paused job keeps its .part file until now
+        self.bus.emit('status', download_id, 'cancelled', '')
+        return True
+
+    def set_weight(self, download_id, weight):
+        """ Sets a job's share of the bandwidth limit relative to other jobs (default 1). """
+        with self._cond:
+            if download_id not in self._job_state:
+                return False
+            self._weights[download_id] = weight
+        self.limiter.set_weight(download_id, weight)
+        return True
+
+    def _enqueue(self, download_item):
+        """ Pushes a queue entry. Caller must hold self._cond. """
+        download_id = download_item['id']
+        seq = next(self._seq)
+        self._items[download_id] = download_item
+        self._queued_seq[download_id] = seq
+        self._job_state[download_id] = 'queued'
+        heapq.heappush(self._queue, (self._priorities.get(download_id, 0), seq, download_item))
+        self._cond.notify()
+
+    def _next_job(self):
+        """ Pops the first runnable job whose host is under its cap. Caller must hold self._cond.
+
+        Jobs backing off before a retry, and jobs for a host whose circuit
+        is open, are skipped; _wake_at is set to when the first of them
+        becomes runnable.
+        """
+        skipped = []
+        job = None
+        now = time.monotonic()
+        self._wake_at = None
+        if self._closing:
+            return None
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            download_id = entry[2]['id']
+            if self._queued_seq.get(download_id) != entry[1]:
+                continue  # Stale entry left behind by pause/cancel/resume.
+            host = self._host_of(entry[2])
+            if self._host_active.get(host, 0) >= self.max_per_host:
+                skipped.append(entry)
+                continue
+            ready_at = max(self._not_before.get(download_id, 0), self.breaker.blocked_until(host, now))
+            if ready_at > now:
+                skipped.append(entry)
+                if ready_at != float('inf'):
+                    self._wake_at = min(self._wake_at or ready_at, ready_at)
+                continue
+            job = entry[2]
+            self.breaker.started(host)
+            break
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+        return job
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                item = self._next_job()
+                while item is None:
+                    self._cond.wait(None if self._wake_at is None else self._wake_at - time.monotonic())
+                    item = self._next_job()
+                download_id = item['id']
+                host = self._host_of(item)
+                del self._queued_seq[download_id]
+                self._not_before.pop(download_id, None)
+                self._job_state[download_id] = 'running'
+                self._running.add(download_id)
+                self._host_active[host] = self._host_active.get(host, 0) + 1
+            status = None
+            try:
+                status = self.run_download(item)
+            finally:
+                report = None
+                with self._cond:
+                    self._running.discard(download_id)
+                    self._host_active[host] -= 1
+                    self.breaker.finished(host)
+                    # Paused or cancelled while stopping (or backing off) wins over what the job ended as
+                    state = self._job_state.get(download_id)
+                    unfinished = status in ('paused', 'retrying')
+                    if unfinished and state == 'running':
+                        self._enqueue(item)  # A retry after its backoff, or a job resumed while it stopped
+                        self._fill_prefetches()
+                        report = 'queued' if status == 'paused' else None
+                    elif unfinished and state == 'paused':
+                        report = 'paused' if status == 'retrying' else None
+                    else:
+                        report = 'cancelled' if unfinished and state == 'cancelled' else None
+                        self._forget(download_id)
+                    # A host slot freed up, so skipped jobs may now be runnable.
+                    self._cond.notify_all()
+                if report == 'cancelled':
+                    self._discard_partial(download_id)
+                if report:
+                    self.bus.emit('status', download_id, report, '')
+
+    def _forget(self, download_id):
+        self._job_state.pop(download_id, None)
+        self._priorities.pop(download_id, None)
+        self._items.pop(download_id, None)
+        self._weights.pop(download_id, None)
+        self._attempts.pop(download_id, None)
+        self._not_before.pop(download_id, None)
+        self._playlists.pop(download_id, None)
+        self._drop_prefetch(download_id)
+
+    def _discard_partial(self, download_id):
+        """ Deletes what a cancelled or failed job left on disk and drops it from the journal. """
+        job = self.journal.get(download_id) if self.journal else None
+        if job is None:
+            return  # Never started writing
+        self.journal.finish(download_id)
+        filename = job['filename']
+        # '<name>.part', '.ytdl', '.segments.part', and the separate streams '<root>.f<format_id>.<ext>'
+        paths = glob.glob(glob.escape(filename) + '.*')
+        paths += glob.glob(glob.escape(os.path.splitext(filename)[0]) + '.f*.*')
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Cannot remove {path}: {e}")
+
+    @staticmethod
+    def _host_of(download_item):
+        return urlparse(download_item['url']).hostname or ''
+
+    # --- Download ---
+    def run_download(self, download_item):
+        """ Runs one job on a worker thread. Returns the status it ended with.
+
+        Jobs that need a merge leave the worker once their streams are on
+        disk ('processing'); the MergePool reports them completed when the
+        merge is done. 'paused' and 'retrying' jobs are kept for later.
+        """
+        download_id = download_item['id']
+        # A URL we already have finishes without touching the network
+        known = self.library.find_url(download_item['url']) if self.library else None
+        if known:
+            self._finish_duplicate(download_id, known)
+            return 'duplicate'
+        try:
+            load_yt_dlp()
+        except ImportError:
+            self.bus.emit('status', download_id, 'error', "yt-dlp is not available")
+            return 'error'
+        if not self._attempts.get(download_id):
+            self.metrics.job_started(download_id)  # A retry carries on timing the same job
+        self.limiter.add(download_id, self._weights.get(download_id, 1.0))
+        status = 'completed'
+        key = None
+        try:
+            ydl_opts = {
+                'outtmpl': os.path.join(self.download_folder, OUTPUT_TEMPLATE),
+                'progress_hooks': [partial(self.progress_hook, download_id)],
+                'postprocessor_hooks': [partial(self.postprocessor_hook, download_id)],
+                'format': DEFAULT_FORMAT,
+                'noplaylist': True,
+                'quiet': True,
+            }
+            # A journaled job repeats its format and output path so that
+            # yt-dlp finds the .part file and only fetches the missing bytes.
+            journaled = self.journal.get(download_id) if self.journal else None
+            if journaled:
+                ydl_opts.update(resume_options(journaled))
+
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                # First, extract info to get title and thumbnail; each URL is
+                # extracted at most once per extraction-cache TTL, usually by the prefetch lane
+                info = self._await_prefetch(download_id) or self.extract_info(ydl, download_item['url'])
+                self.metrics.job_extracted(download_id)
+                if info.get('_type') in PLAYLIST_TYPES:
+                    status = 'playlist'
+                    self.expand_playlist(download_id, info)
+                    return status
+
+                # A different URL for a video we have, or one another job is fetching
+                key = video_key(info)
+                if key and self.library:
+                    known = self.library.find_video(key)
+                    if known:
+                        self.library.add_url(download_item['url'], key)
+                        status = 'duplicate'
+                        self._finish_duplicate(download_id, known)
+                        return status
+                    owner = self._claim(key, download_id)
+                    if owner != download_id:
+                        key = None  # Not ours to release
+                        status = 'duplicate'
+                        self.bus.emit('status', download_id, 'error', f"Already downloading as #{owner}")
+                        return status
+
+                # A cached info was processed with the default format; a resumed
+                # job must get the one its .part file was started with
+                overrides = {'format': journaled['format']} if journaled else download_item.get('format_options')
+                info = self.select_format(ydl, download_id, info, overrides)
+
+                title = info.get('title', 'Unknown Title')
+                thumbnail = info.get('thumbnail', '')
+                self.bus.emit('info', download_id, title, thumbnail)
+
+                # Refuse now rather than at 95%; merged formats briefly need room for two copies
+                size = estimated_size(info)
+                if size and journaled and not (self.segments > 1 and self._is_segmentable(info)):
+                    # yt-dlp continues the .part file; a segmented download starts over
+                    size = max(size - journaled.get('offset', 0), 0)
+                if size and len(info.get('requested_formats') or []) > 1:
+                    size *= MERGE_SPACE_FACTOR
+                self.storage.reserve(download_id, size)
+
+                if self.journal and not journaled:
+                    self.journal.start(download_id, download_item['url'],
+                                       info.get('format_id'), ydl.prepare_filename(info))
+                
+                # Now, start the actual download from the info we already have
+                path, streams = self.download_info(ydl, download_id, info)
+                self._record_host(download_item, None)
+
+            if streams:
+                status = 'processing'
+                self.bus.emit('status', download_id, 'processing', '')
+                self.metrics.job_merge_started(download_id)
+                merge = self.merger.submit(streams, path, info.get('duration'),
+                                           partial(self._merge_progress, download_id))
+                merge.add_done_callback(partial(self._merge_done, download_item, key, path, title,
+                                                info.get('format_id')))
+            else:
+                status = self.finish_download(download_item, key, path, title, info.get('format_id'))
+
+        except yt_dlp.utils.DownloadCancelled:
+            with self._cond:
+                if self._closing:
+                    status = 'interrupted'  # By close(): the row, journal entry and .part stay for the next start
+                elif self._job_state.get(download_id) == 'paused':
+                    status = 'paused'
+                else:
+                    status = 'cancelled'
+                    self._forget(download_id)
+            if status == 'cancelled':
+                self._discard_partial(download_id)
+            if status != 'interrupted':
+                self.bus.emit('status', download_id, status, '')
+
+        except Exception as e:
+            kind = classify(e)
+            self._record_host(download_item, kind, retry_after(e))
+            status = 'retrying' if self._retry(download_item, kind, e) else 'error'
+            if status == 'error':
+                self._fail(download_item, e)
+
+        finally:
+            with self._progress_lock:
+                self._stream_progress.pop(download_id, None)
+            self.limiter.remove(download_id)
+            if status != 'processing':
+                self._release(key, download_id)
+            if status not in ('processing', 'retrying'):
+                self.metrics.job_finished(download_id, status)  # Retries are counted by job_retries
+        return status
+
+    def finish_download(self, download_item, key, path, title, format_id):
+        """ Completes a job whose file is final; returns its status. """
+        download_id = download_item['id']
+        try:
+            if self.journal:
+                self.journal.finish(download_id)
+            if key and self.library and path and os.path.exists(path):
+                self.index_download(download_item['url'], key, path, title, format_id)
+        except Exception as e:
+            self._fail(download_item, e)
+            return 'error'
+        self.bus.emit('status', download_id, 'completed', 'Finished')
+        return 'completed'
+
+    def _merge_done(self, download_item, key, path, title, format_id, merge):
+        """ MergePool callback: finishes a job whose streams were merged (or failed to). """
+        download_id = download_item['id']
+        if merge.cancelled():
+            return  # Shut down before its turn; the journal resumes it next start
+        self.metrics.job_merge_finished(download_id)
+        try:
+            merge.result()
+            status = self.finish_download(download_item, key, path, title, format_id)
+        except Exception as e:
+            status = 'error'
+            self._fail(download_item, e)
+        self._release(key, download_id)
+        self.metrics.job_finished(download_id, status)
+
+    def _release(self, key, download_id):
+        """ Gives up the job's video claim and storage reservation. """
+        self.storage.release(download_id)
+        if key:
+            with self._cond:
+                if self._claims.get(key) == download_id:
+                    del self._claims[key]
+
+    def _fail(self, download_item, e):
+        # Nothing will resume it, so its .part files would only take up space
+        self._discard_partial(download_item['id'])
+        if self.extract_cache:
+            # The cached format URLs may be what failed; extract afresh next time
+            self.extract_cache.discard(download_item['url'])
+        self.bus.emit('status', download_item['id'], 'error', error_message(e))
+        print(f"Error downloading {download_item['url']}: {e}")
+
+    # --- Retries ---
+    def _retry(self, download_item, kind, e):
+        """ Schedules a failed job's next attempt if ``kind`` has attempts left. Returns True if it did.
+
+        The worker requeues the job once run_download has returned; it runs
+        after its backoff. The journal entry is kept, so the next attempt
+        continues the .part file.
+        """
+        download_id = download_item['id']
+        with self._cond:
+            if self._job_state.get(download_id) != 'running':
+                return False  # Paused or cancelled meanwhile
+            attempt = self._attempts.get(download_id, 0) + 1
+            delay = self.retry_policy.delay(kind, attempt, retry_after(e))
+            if delay is None:
+                return False
+            self._attempts[download_id] = attempt
+            self._not_before[download_id] = time.monotonic() + delay
+        if self.extract_cache:
+            # Format URLs expire; the retry extracts afresh
+            self.extract_cache.discard(download_item['url'])
+        self.metrics.inc('job_retries', kind=kind)
+        # Rounded up: jitter makes most early delays shorter than a second
+        self.bus.emit('status', download_id, 'queued', f"Retry {attempt} in {math.ceil(delay)}s")
+        print(f"Retrying {download_item['url']} in {math.ceil(delay)}s after a {kind} error: {error_message(e)}")
+        return True
+
+    def _record_host(self, download_item, kind, wait=None):
+        """ Feeds a download's result to the circuit breaker of its host. """
+        host = self._host_of(download_item)
+        with self._cond:
+            opened = self.breaker.record(host, kind, time.monotonic(), wait)
+        if opened:
+            self.metrics.inc('circuit_breaker_opened')
+            print(f"Pausing downloads from {host} after repeated {kind} errors")
+
+    def _merge_progress(self, download_id, fraction):
+        self.bus.emit('progress', download_id, fraction * 100, "Merging")
+
+    def download_info(self, ydl, download_id, info):
+        """ Downloads an extracted video. Returns (final path, streams to merge or None).
+
+        Separate video and audio streams are fetched at the same time and
+        handed back for the MergePool; a single progressive file goes over
+        parallel byte ranges when enabled and possible.
+        """
+        path = ydl.prepare_filename(info)
+        formats = info.get('requested_formats') or []
+        if len(formats) > 1 and self.merger.available:
+            return path, self.download_streams(ydl, download_id, info, formats, path)
+        if self.segments > 1 and self._is_segmentable(info):
+            try:
+                return SegmentedDownload(info['url'], path, self.segments,
+                                         headers=self._request_headers(ydl, info),
+                                         progress_hook=partial(self.progress_hook, download_id)).run(), None
+            except SegmentedUnsupported:
+                pass  # No range support; let yt-dlp stream it
+        result = ydl.process_ie_result(info, download=True) or info
+        downloads = result.get('requested_downloads') or [{}]
+        return downloads[0].get('filepath') or ydl.prepare_filename(result), None
+
+    def download_streams(self, ydl, download_id, info, formats, path):
+        """ Downloads every requested format at once, each to '<name>.f<format_id>.<ext>'.
+
+        Returns the streams for MergePool.submit, with what each one carries.
+        """
+        root = os.path.splitext(path)[0]
+        jobs = []
+        for f in formats:
+            stream_info = dict(info)
+            stream_info.pop('requested_formats', None)
+            stream_info.update(f)
+            jobs.append((f"{root}.f{f['format_id']}.{f['ext']}", stream_info, self._stream_kinds(len(jobs), f)))
+
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix='torro-stream') as pool:
+            futures = [pool.submit(ydl.dl, name, stream_info) for name, stream_info, kinds in jobs]
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            failed = [future for future in done if future.exception() is not None]
+            if failed:
+                # The first failure wins; progress_hook stops the other streams rather than finish them
+                self._stopping.add(download_id)
+                try:
+                    wait(pending)
+                finally:
+                    self._stopping.discard(download_id)
+                raise failed[0].exception()
+        return [(name, *kinds) for name, stream_info, kinds in jobs]
+
+    @staticmethod
+    def _stream_kinds(index, f):
+        """ (has_video, has_audio) for a requested format; yt-dlp marks a missing track with codec 'none'. """
+        vcodec, acodec = f.get('vcodec'), f.get('acodec')
+        # Codecs an extractor did not report: assume yt-dlp's usual video+audio order
+        has_video = vcodec != 'none' if vcodec else index == 0
+        has_audio = acodec != 'none' if acodec else index > 0
+        return has_video, has_audio
+
+    def select_format(self, ydl, download_id, info, overrides=None):
+        """ Applies the format policy (or the job's literal 'format' override) to ``info``.
+
+        ``info`` was processed with yt-dlp's default selection; if the policy
+        wants something else, yt-dlp's selection is re-run offline on the
+        same formats and the re-processed info is returned.
+        """
+        overrides = overrides or {}
+        spec = overrides.get('format')
+        if not spec:
+            throughput = self.metrics.quantile('job_throughput_bytes_per_second', 0.5)
+            if self.limiter.rate:
+                throughput = min(throughput or self.limiter.rate, self.limiter.rate)
+            policy = self.format_policy.with_overrides(overrides)
+            if not self.merger.available:
+                policy.allow_merge = False  # Without ffmpeg separate streams could never be joined
+            spec = policy.choose(info, throughput=throughput, free_bytes=self.storage.available())
+        if not spec or spec == info.get('format_id'):
+            return info
+        self.metrics.inc('format_choices', merge='+' in spec)
+        ydl.params['format'] = spec
+        ydl.format_selector = ydl.build_format_selector(spec)
+        # Selection results from the first pass must not leak into the second
+        info = dict(info)
+        info.pop('requested_formats', None)
+        info.pop('requested_downloads', None)
+        return ydl.sanitize_info(ydl.process_ie_result(info, download=False))
+
+    def index_download(self, url, key, path, title, format_id):
+        """ Adds a finished file to the library, sharing storage with an identical one. """
+        self.library.record(url, key, path, title, format_id)
+        if not DEDUP_LINK_IDENTICAL:
+            return
+        identical = self.library.find_identical(key)
+        if identical:
+            method = link_identical(identical, path)
+            if method:
+                print(f"{os.path.basename(path)} has the same bytes as {identical}; stored as a {method}")
+                # Linking changed the file's mtime, which the index checks
+                self.library.record(url, key, path, title, format_id)
+
+    def _claim(self, key, download_id):
+        """ Marks ``key`` as being downloaded by ``download_id``; returns the job that holds it. """
+        with self._cond:
+            return self._claims.setdefault(key, download_id)
+
+    def _finish_duplicate(self, download_id, known):
+        """ Completes a job whose video is already on disk. """
+        if self.journal:
+            self.journal.finish(download_id)
+        self.bus.emit('info', download_id, known['title'] or os.path.basename(known['path']), '')
+        self.bus.emit('status', download_id, 'completed', 'Already downloaded')
+
+    @staticmethod
+    def _request_headers(ydl, info):
+        """ The headers yt-dlp would send for ``info['url']``, with its cookies. """
+        headers = dict(info.get('http_headers') or {})
+        cookiejar = getattr(ydl, 'cookiejar', None)
+        cookies = cookiejar.get_cookie_header(info['url']) if hasattr(cookiejar, 'get_cookie_header') else None
+        if cookies:
+            headers['Cookie'] = cookies
+        return headers
+
+    @staticmethod
+    def _is_segmentable(info):
+        """ True for a single progressive HTTP file, i.e. nothing to merge or reassemble. """
+        return (not info.get('requested_formats') and not info.get('is_live')
+                and info.get('protocol') in ('http', 'https') and bool(info.get('url')))
+
+    # --- Metadata prefetch ---
+    def _fill_prefetches(self):
+        """ Starts prefetches for the first ``prefetch_ahead`` live queue entries. Caller must hold self._cond. """
+        if not self._prefetcher or not YT_DLP_AVAILABLE or len(self._prefetches) >= self.prefetch_ahead:
+            return
+        live = (entry[2] for entry in sorted(self._queue)
+                if self._queued_seq.get(entry[2]['id']) == entry[1])
+        for download_item in itertools.islice(live, self.prefetch_ahead):
+            if download_item['id'] not in self._prefetches:
+                self._prefetches[download_item['id']] = self._prefetcher.submit(self._prefetch, download_item)
+
+    def _drop_prefetch(self, download_id):
+        """ Cancels a job's prefetch if it has not started, and moves the window on. Caller must hold self._cond. """
+        prefetch = self._prefetches.pop(download_id, None)
+        if prefetch is not None:
+            prefetch.cancel()
+            self._fill_prefetches()
+
+    def _prefetch(self, download_item):
+        """ Prefetch lane task: extracts a queued job into the cache and reports its details. """
+        download_id = download_item['id']
+        with self._cond:
+            if (self._job_state.get(download_id) != 'queued'
+                    or self.breaker.blocked_until(self._host_of(download_item), time.monotonic())):
+                return  # Started, paused or cancelled meanwhile, or its host is failing
+        if self.library and self.library.find_url(download_item['url']):
+            return
+        started = time.perf_counter()
+        try:
+            load_yt_dlp()
+            ydl = getattr(self._prefetch_local, 'ydl', None)
+            if ydl is None:
+                ydl = self._prefetch_local.ydl = yt_dlp.YoutubeDL({'format': DEFAULT_FORMAT, 'noplaylist': True,
+                                                                   'quiet': True})
+            info = self.extract_info(ydl, download_item['url'])
+        except Exception as e:
+            # The worker extracts again and deals with the error properly
+            self.metrics.inc('prefetch_failures')
+            print(f"Cannot prefetch {download_item['url']}: {e}")
+            return
+        self.metrics.observe('prefetch_seconds', time.perf_counter() - started)
+        title = info.get('title') or 'Unknown Title'
+        if info.get('_type') in PLAYLIST_TYPES:
+            title = f"Playlist: {title}"
+            # Its entries are a lazy iterator, so it cannot be cached: the worker
+            # takes it over, along with the YoutubeDL that iterates it
+            self._prefetch_local.ydl = None
+            with self._cond:
+                if download_id in self._job_state:
+                    self._playlists[download_id] = info
+        self.bus.emit('metadata', download_id, title, info.get('thumbnail') or '', info.get('duration'))
+
+    def _await_prefetch(self, download_id):
+        """ Lets a running prefetch of this job finish instead of extracting twice; drops one not yet started.
+
+        Returns the playlist the prefetch extracted, if it was one; anything
+        else is in the extraction cache.
+        """
+        with self._cond:
+            prefetch = self._prefetches.pop(download_id, None)
+            self._fill_prefetches()  # This job left the window
+        if prefetch is not None and not prefetch.cancel():
+            prefetch.exception()  # Waits; failures were already handled by _prefetch
+        with self._cond:
+            return self._playlists.pop(download_id, None)
+
+    def extract_info(self, ydl, url):
+        """ Returns a JSON-safe info dict for ``url``, from the cache when possible.
+
+        Playlists come back unprocessed, with ``entries`` still a lazy
+        iterator, so they can be streamed into the queue by expand_playlist.
+        """
+        info = self.extract_cache.get(url) if self.extract_cache else None
+        if info is None:
+            # process=False is the same single extraction extract_info would
+            # do, minus resolving every playlist entry up front
+            info = ydl.extract_info(url, download=False, process=False)
+            if info.get('_type') in PLAYLIST_TYPES:
+                return info
+            info = ydl.sanitize_info(ydl.process_ie_result(info, download=False))
+            if info.get('_type') in PLAYLIST_TYPES:
+                return info  # A redirect that landed on a playlist
+            if self.extract_cache:
+                self.extract_cache.put(url, info)
+        return info
+
+    def expand_playlist(self, download_id, playlist):
+        """ Queues a playlist's entries one by one as the extractor yields them. """
+        title = playlist.get('title') or 'Playlist'
+        count = 0
+        for entry in playlist.get('entries') or []:
+            if self._job_state.get(download_id) == 'cancelled':
+                raise yt_dlp.utils.DownloadCancelled()
+            url = entry and (entry.get('webpage_url') or entry.get('url'))
+            if not url:
+                continue
+            count += 1
+            self.bus.emit('playlist_entry', download_id, url, entry.get('title'))
+            if count == 1 or count % 10 == 0:
+                self.bus.emit('info', download_id, f"Playlist: {title} ({count} queued...)", '')
+        self.bus.emit('info', download_id, f"Playlist: {title} ({count} videos)", playlist.get('thumbnail', ''))
+        self.bus.emit('status', download_id, 'completed', 'Queued')
+
+    def progress_hook(self, download_id, d):
+        """ yt-dlp hook to capture download progress. """
+        if self._job_state.get(download_id) in ('paused', 'cancelled') or download_id in self._stopping:
+            # Raising here is how yt-dlp lets us stop a transfer midway.
+            raise yt_dlp.utils.DownloadCancelled()
+
+        self.metrics.inc('progress_hook_calls')
+        if d['status'] == 'downloading':
+            self.metrics.job_progress(download_id, d.get('downloaded_bytes'))
+            downloaded, total_bytes, speed = self._stream_totals(download_id, d)
+            if total_bytes:
+                progress = (downloaded / total_bytes) * 100
+                speed_str = f"{speed / 1024 / 1024:.2f} MB/s" if speed else ""
+                self.bus.emit('progress', download_id, progress, speed_str)
+
+            if self.journal:
+                self.journal.progress(download_id, downloaded)
+
+            # Sleeping here is what holds the transfer to its bandwidth share
+            waited = self.limiter.progress(download_id, d.get('filename'), d['downloaded_bytes'])
+            if waited:
+                self.metrics.inc('throttled_seconds', waited)
+        
+        elif d['status'] == 'finished':
+            # Completion is reported by finish_download, once the file is final
+            self.metrics.job_downloaded(download_id, d.get('total_bytes') or d.get('downloaded_bytes'))
+
+    def _stream_totals(self, download_id, d):
+        """ (downloaded, total, speed) over every file the job is fetching at once. """
+        total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+        with self._progress_lock:
+            streams = self._stream_progress.setdefault(download_id, {})
+            streams[d.get('filename')] = (d['downloaded_bytes'], total_bytes, d.get('speed'))
+            if len(streams) == 1:
+                return d['downloaded_bytes'], total_bytes, d.get('speed')
+            values = list(streams.values())
+        totals = [total for downloaded, total, speed in values]
+        return (sum(downloaded for downloaded, total, speed in values),
+                sum(totals) if all(totals) else None,
+                sum(speed or 0 for downloaded, total, speed in values))
+
+    def postprocessor_hook(self, download_id, d):
+        """ yt-dlp postprocessor hook; times the audio/video merge. """
+        if d.get('postprocessor') != 'Merger':
+            return
+        if d['status'] == 'started':
+            self.metrics.job_merge_started(download_id)
+        elif d['status'] == 'finished':
+            self.metrics.job_merge_finished(download_id)
@@ -0,0 +1,275 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+SAMPLE_WINDOW = 1024   # Recent observations kept per summary for quantiles
+RECENT_JOBS = 100      # Per-job timings kept for the diagnostics panel
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = 'torro_'
+
+class StartupTimer:
+    """ Records when each startup phase finished, relative to ``origin``.
+
+    ``origin`` should be taken as early as possible, before the heavy
+    imports, e.g. the first line of main.py. Marks may come from any
+    thread; a phase is only recorded the first time it is marked.
+    """
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.marks = {}  # phase -> seconds since origin, in insertion order
+
+    def mark(self, phase):
+        if phase not in self.marks:
+            self.marks[phase] = time.perf_counter() - self.origin
+        return self.marks[phase]
+
+    def get(self, phase):
+        return self.marks.get(phase)
+
+    def report(self):
+        """ One line like 'imports 410 ms, build 95 ms, first_frame 620 ms'. """
+        return ', '.join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in self.marks.items())
+
+class Summary:
+    """ Count, sum, min, max and a window of recent samples for quantiles. """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+        self._samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+        self._samples.append(value)
+
+    def quantile(self, q):
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self):
+        snapshot = {'count': self.count, 'sum': self.total, 'min': self.min, 'max': self.max,
+                    'last': self.last}
+        snapshot.update((f"p{int(q * 100)}", self.quantile(q)) for q in QUANTILES)
+        return snapshot
+
+class JobTimings:
+    """ Timings of one download attempt, in seconds. None until measured. """
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.started = time.monotonic()
+        self.download_started = None
+        self.merge_started = None
+        self.extract = None
+        self.ttfb = None
+        self.download = None
+        self.merge = None
+        self.bytes = 0
+        self.status = 'running'
+
+    @property
+    def throughput(self):
+        """ Bytes per second over the transfer itself, excluding extraction and merging. """
+        return self.bytes / self.download if self.download else None
+
+    def snapshot(self):
+        return {'id': self.job_id, 'status': self.status, 'extract_s': self.extract,
+                'ttfb_s': self.ttfb, 'download_s': self.download, 'merge_s': self.merge,
+                'bytes': self.bytes, 'throughput_bps': self.throughput}
+
+class Metrics:
+    """ Thread-safe counters, gauges and summaries, plus per-job download timings.
+
+    Worker threads report job phases (job_started / job_extracted /
+    job_progress / job_downloaded / job_merge_* / job_finished); the UI or
+    CLI owner reports its own costs with observe() and set_gauge(). Names
+    are plain snake_case with the unit as suffix; ``labels`` become
+    Prometheus labels on export.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> value
+        self._gauges = {}      # (name, labels) -> value
+        self._summaries = {}   # (name, labels) -> Summary
+        self._jobs = OrderedDict()  # job id -> JobTimings, oldest first
+
+    # --- Generic instruments ---
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = Summary()
+            summary.observe(value)
+
+    def quantile(self, name, q, **labels):
+        """ Quantile ``q`` of the recent samples of a summary, or None if it has none. """
+        with self._lock:
+            summary = self._summaries.get((name, tuple(sorted(labels.items()))))
+            return summary.quantile(q) if summary is not None else None
+
+    def timed(self, name, **labels):
+        """ Context manager observing the wall time of its block under ``name``. """
+        return _Timed(self, name, labels)
+
+    # --- Per-job timings ---
+    def job_started(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._jobs[job_id] = JobTimings(job_id)
+            while len(self._jobs) > RECENT_JOBS:
+                self._jobs.popitem(last=False)
+
+    def job_extracted(self, job_id):
+        """ Extraction is done; the transfer starts now. """
+        job = self._jobs.get(job_id)
+        if job is not None and job.extract is None:
+            job.download_started = time.monotonic()
+            job.extract = job.download_started - job.started
+            self.observe('job_extract_seconds', job.extract)
+
+    def job_progress(self, job_id, downloaded_bytes):
+        """ Called from the progress hook; only the first call with data costs anything. """
+        job = self._jobs.get(job_id)
+        if job is not None and job.ttfb is None and downloaded_bytes and job.download_started:
+            job.ttfb = time.monotonic() - job.download_started
+            self.observe('job_ttfb_seconds', job.ttfb)
+
+    def job_downloaded(self, job_id, size):
+        """ One file of the job finished; a merged video reports this once per format. """
+        job = self._jobs.get(job_id)
+        if job is not None and job.download_started:
+            job.bytes += size or 0
+            job.download = time.monotonic() - job.download_started
+
+    def job_merge_started(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.merge_started = time.monotonic()
+
+    def job_merge_finished(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None and job.merge_started:
+            job.merge = time.monotonic() - job.merge_started
+            self.observe('job_merge_seconds', job.merge)
+
+    def job_finished(self, job_id, status):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.status = status
+            if job.throughput:
+                self.observe('job_throughput_bytes_per_second', job.throughput)
+        self.inc('jobs_finished', status=status)
+
+    def recent_jobs(self):
+        with self._lock:
+            return [job.snapshot() for job in reversed(self._jobs.values())]
+
+    # --- Export ---
+    def snapshot(self):
+        """ Everything as plain JSON-serializable data. """
+        with self._lock:
+            return {
+                'counters': [dict(name=name, labels=dict(labels), value=value)
+                             for (name, labels), value in self._counters.items()],
+                'gauges': [dict(name=name, labels=dict(labels), value=value)
+                           for (name, labels), value in self._gauges.items()],
+                'summaries': [dict(name=name, labels=dict(labels), **summary.snapshot())
+                              for (name, labels), summary in self._summaries.items()],
+                'jobs': [job.snapshot() for job in reversed(self._jobs.values())],
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """ Prometheus text exposition format (version 0.0.4). """
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+
+        def sample(name, labels, value, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+            if value is not None:
+                lines.append(f"{name}{_label_text(labels)} {value:g}")
+
+        for counter in snapshot['counters']:
+            sample(f"{METRIC_PREFIX}{counter['name']}_total", counter['labels'], counter['value'], 'counter')
+        for gauge in snapshot['gauges']:
+            sample(METRIC_PREFIX + gauge['name'], gauge['labels'], gauge['value'], 'gauge')
+        for summary in snapshot['summaries']:
+            name = METRIC_PREFIX + summary['name']
+            for q in QUANTILES:
+                sample(name, dict(summary['labels'], quantile=str(q)),
+                       summary[f"p{int(q * 100)}"], 'summary')
+            lines.append(f"{name}_sum{_label_text(summary['labels'])} {summary['sum']:g}")
+            lines.append(f"{name}_count{_label_text(summary['labels'])} {summary['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """ Writes the metrics to ``path``: JSON for *.json, Prometheus text otherwise. """
+        text = self.to_json() if path.endswith('.json') else self.to_prometheus()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def report_lines(self):
+        """ Human-readable lines for the diagnostics panel. """
+        snapshot = self.snapshot()
+        lines = []
+        for summary in snapshot['summaries']:
+            scale, unit = (1 / 1024 / 1024, 'MB/s') if summary['name'].endswith('_bytes_per_second') \
+                else (1000, 'ms') if summary['name'].endswith('_seconds') else (1, '')
+            p50, p95 = summary['p50'], summary['p95']
+            lines.append(f"{_describe(summary)}: p50 {p50 * scale:.1f} / p95 {p95 * scale:.1f} {unit} "
+                         f"(n={summary['count']})")
+        for gauge in snapshot['gauges']:
+            lines.append(f"{_describe(gauge)}: {gauge['value']:g}")
+        for counter in snapshot['counters']:
+            lines.append(f"{_describe(counter)}: {counter['value']}")
+        return lines
+
+class _Timed:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+def _describe(entry):
+    labels = ', '.join(f"{key}={value}" for key, value in entry['labels'].items())
+    return f"{entry['name']} [{labels}]" if labels else entry['name']
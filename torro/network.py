@@ -0,0 +1,15 @@
+def is_metered():
+    """ True when Android reports the active network as metered (mobile data, a
+    metered Wi-Fi or hotspot). Needs ACCESS_NETWORK_STATE. Always False elsewhere. """
+    try:
+        from jnius import autoclass
+    except ImportError:
+        return False
+    try:
+        activity = autoclass('org.kivy.android.PythonActivity').mActivity
+        context = autoclass('android.content.Context')
+        connectivity = activity.getSystemService(context.CONNECTIVITY_SERVICE)
+        return bool(connectivity.isActiveNetworkMetered())
+    except Exception as e:
+        print(f"Cannot query the network state: {e}")
+        return False
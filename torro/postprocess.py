@@ -0,0 +1,88 @@
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_CONCURRENT_MERGES = 1  # ffmpeg processes at once; merging is disk-bound, more rarely helps
+
+class MergeError(Exception):
+    """ ffmpeg could not merge the streams. """
+
+class MergePool:
+    """ Merges separately downloaded video and audio streams with ffmpeg.
+
+    Merges run as ffmpeg subprocesses, at most ``workers`` at a time, on
+    their own threads, so a download worker hands its streams over and
+    moves straight on to the next job. Streams are copied, never
+    re-encoded, into a temporary file next to the output, which is then
+    renamed into place; the stream files are deleted afterwards.
+    """
+    def __init__(self, workers=MAX_CONCURRENT_MERGES, ffmpeg=None):
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='torro-merge')
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def available(self):
+        return self.ffmpeg is not None
+
+    @property
+    def pending(self):
+        """ Merges queued or running. """
+        return self._pending
+
+    def shutdown(self, wait=False):
+        """ Stops taking merges and cancels queued ones; a running ffmpeg is left to finish. """
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def submit(self, streams, output, duration=None, progress=None):
+        """ Queues a merge of ``streams`` into ``output``; returns a Future.
+
+        ``streams`` are ``(path, has_video, has_audio)`` in any order, as
+        yt-dlp's format spec requested them ('ba+bv' puts audio first): the
+        first stream with video and the first with audio are mapped.
+        ``progress(fraction)`` is called from the merge thread as ffmpeg
+        reports its position, if ``duration`` (seconds) is known.
+        """
+        with self._lock:
+            self._pending += 1
+        return self._executor.submit(self._merge, list(streams), output, duration, progress)
+
+    def _merge(self, streams, output, duration, progress):
+        try:
+            root, ext = os.path.splitext(output)
+            tmp_path = f"{root}.temp{ext}"
+            command = [self.ffmpeg, '-y', '-nostdin', '-loglevel', 'error', '-progress', 'pipe:1']
+            for path, has_video, has_audio in streams:
+                command += ['-i', path]
+            video = next((index for index, stream in enumerate(streams) if stream[1]), None)
+            audio = next((index for index, stream in enumerate(streams) if stream[2]), None)
+            for index, kind in ((video, 'v'), (audio, 'a')):
+                if index is not None:
+                    command += ['-map', f"{index}:{kind}:0?"]  # '?' tolerates a codec reported wrongly
+            command += ['-c', 'copy', tmp_path]
+
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       text=True, errors='replace')
+            for line in process.stdout:
+                key, _, value = line.strip().partition('=')
+                if key == 'out_time_us' and duration and progress and value.isdigit():
+                    progress(min(1.0, int(value) / 1e6 / duration))
+            error = process.stderr.read()
+            if process.wait() != 0:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise MergeError(error.strip().splitlines()[-1] if error.strip() else
+                                 f"ffmpeg exited with {process.returncode}")
+            os.replace(tmp_path, output)
+            for path, has_video, has_audio in streams:
+                if os.path.exists(path):
+                    os.remove(path)
+            if progress:
+                progress(1.0)
+            return output
+        finally:
+            with self._lock:
+                self._pending -= 1
@@ -0,0 +1,121 @@
+import threading
+import time
+
+BURST_SECONDS = 0.5     # A job may run this far ahead of its rate before it is slowed down
+MAX_WAIT = 0.5          # Longest single sleep, so pause/cancel stay responsive; the rest is carried over
+FOREGROUND_SHARE = 0.6  # Fraction of the limit reserved for the foreground job while others run
+
+class _Bucket:
+    __slots__ = ('weight', 'rate', 'tokens', 'stamp', 'positions')
+
+    def __init__(self, weight):
+        self.weight = weight
+        self.rate = None        # bytes per second, None while unlimited
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+        self.positions = {}     # file -> bytes last seen by progress(); a job may fetch several at once
+
+class RateLimiter:
+    """ Global download rate limit, shared by the running jobs by weight.
+
+    Each running job has its own token bucket whose rate is its share of
+    the global limit: ``weight / sum(weights)`` of it, except that the
+    foreground job gets FOREGROUND_SHARE of the limit to itself while any
+    other job is running. Shares are recomputed only when jobs come and go
+    or settings change, so the per-block cost is one lock and a little
+    arithmetic, and nothing at all while unlimited.
+
+    Throttling works by making the downloading thread sleep in
+    ``consume()``, which is called from the progress hook; yt-dlp calls the
+    hook once per block, so the transfer simply stops reading for a while.
+    """
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.foreground = None
+        self._lock = threading.Lock()
+        self._buckets = {}  # job id -> _Bucket
+
+    def set_rate(self, rate):
+        """ Changes the global limit in bytes per second; None removes it. """
+        with self._lock:
+            self.rate = rate
+            self._reshare()
+
+    def set_foreground(self, job_id):
+        """ Gives ``job_id`` the foreground lane; None clears it. """
+        with self._lock:
+            self.foreground = job_id
+            self._reshare()
+
+    def set_weight(self, job_id, weight):
+        with self._lock:
+            bucket = self._buckets.get(job_id)
+            if bucket is not None:
+                bucket.weight = weight
+                self._reshare()
+
+    def add(self, job_id, weight=1.0):
+        """ Registers a running job. """
+        with self._lock:
+            self._buckets[job_id] = _Bucket(weight)
+            self._reshare()
+
+    def remove(self, job_id):
+        with self._lock:
+            if self._buckets.pop(job_id, None) is not None:
+                self._reshare()
+
+    def share(self, job_id):
+        """ Current rate of ``job_id`` in bytes per second, None if unlimited. """
+        bucket = self._buckets.get(job_id)
+        return bucket.rate if bucket is not None else None
+
+    def _reshare(self):
+        """ Recomputes every bucket's rate. Caller must hold self._lock. """
+        buckets = self._buckets
+        if self.rate is None:
+            for bucket in buckets.values():
+                bucket.rate = None
+            return
+        pool = self.rate
+        foreground = buckets.get(self.foreground)
+        background = [bucket for job_id, bucket in buckets.items() if job_id != self.foreground]
+        if foreground is not None:
+            foreground.rate = self.rate * FOREGROUND_SHARE if background else self.rate
+            pool -= foreground.rate
+        total_weight = sum(bucket.weight for bucket in background) or 1
+        for bucket in background:
+            bucket.rate = pool * bucket.weight / total_weight
+
+    def progress(self, job_id, key, downloaded):
+        """ Accounts a yt-dlp progress report: ``downloaded`` bytes so far of file ``key``.
+
+        The first report for a file only sets the baseline, so bytes that
+        were already on disk when a download resumed are never charged.
+        """
+        bucket = self._buckets.get(job_id)
+        if bucket is None:
+            return 0
+        last = bucket.positions.get(key)
+        bucket.positions[key] = downloaded
+        if last is not None and downloaded > last:
+            return self.consume(job_id, downloaded - last)
+        return 0
+
+    def consume(self, job_id, count):
+        """ Takes ``count`` bytes from the job's bucket, sleeping if it ran dry. Returns the wait. """
+        bucket = self._buckets.get(job_id)
+        if bucket is None or bucket.rate is None:
+            return 0
+        with self._lock:
+            rate = bucket.rate
+            if rate is None:
+                return 0
+            now = time.monotonic()
+            bucket.tokens = min(rate * BURST_SECONDS, bucket.tokens + (now - bucket.stamp) * rate)
+            bucket.stamp = now
+            bucket.tokens -= count
+            wait = min(-bucket.tokens / rate, MAX_WAIT) if bucket.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,183 @@
+import errno
+import random
+import re
+
+# --- Retry budgets (attempts after the first failure) and backoff, in seconds ---
+TRANSIENT_RETRIES = 5
+THROTTLED_RETRIES = 3
+BACKOFF_BASE = 2.0          # First delay cap; doubles per attempt, and the delay is uniform below it
+BACKOFF_MAX = 5 * 60
+THROTTLED_BACKOFF_BASE = 30.0
+
+# --- Per-host circuit breaker ---
+BREAKER_THRESHOLD = 3       # Consecutive network failures before a host is paused
+BREAKER_COOLDOWN = 60.0     # First pause; doubles with every failed probe
+BREAKER_MAX_COOLDOWN = 15 * 60
+
+# Failure kinds. Only TRANSIENT and THROTTLED are retried, and only they
+# count against a host: a private or missing video says nothing about the site.
+TRANSIENT = 'transient'
+THROTTLED = 'throttled'
+BLOCKED = 'blocked'         # Geo-restricted, or needs sign-in / cookies
+PERMANENT = 'permanent'
+
+TRANSIENT_ERRNOS = {errno.ECONNRESET, errno.ECONNREFUSED, errno.ECONNABORTED, errno.ETIMEDOUT,
+                    errno.ENETUNREACH, errno.ENETDOWN, errno.EHOSTUNREACH, errno.EPIPE}
+# Matched by name so that classifying never imports yt-dlp or requests
+TRANSIENT_TYPES = {'TimeoutError', 'ConnectionError', 'IncompleteRead', 'RemoteDisconnected',
+                   'gaierror', 'TransportError', 'ProxyError', 'SSLError', 'ContentTooShortError'}
+BLOCKED_TYPES = {'GeoRestrictedError'}
+
+MESSAGE_PATTERNS = [
+    (THROTTLED, re.compile(r'HTTP Error 429\b|too many requests|rate.?limit', re.I)),
+    (BLOCKED, re.compile(r'not (made )?available in your country|geo.?restrict|sign in|log ?in|'
+                         r'private video|members.only|age.?restrict|confirm your age|use --cookies', re.I)),
+    (TRANSIENT, re.compile(r'timed? ?out|connection (reset|refused|aborted)|network is unreachable|'
+                           r'temporary failure|name resolution|incomplete ?read|remote end closed|'
+                           r'broken pipe|unable to download webpage|HTTP Error 50[0234]\b|bad gateway|'
+                           r'service unavailable', re.I)),
+]
+MESSAGE_PREFIX = re.compile(r'^(ERROR:\s*)?(\[[^\]]+\]\s*([\w-]+:\s*)?)?')
+
+def classify(error):
+    """ Failure kind of an exception raised by a download: TRANSIENT, THROTTLED, BLOCKED or PERMANENT.
+
+    The exception and everything it wraps (yt-dlp keeps the original in
+    ``exc_info``) are checked for an HTTP status and for known network
+    exception types, then the message for the phrases yt-dlp uses.
+    Anything unrecognised is PERMANENT, so a bug is never retried blindly.
+    """
+    for exc in _chain(error):
+        status = _http_status(exc)
+        if status == 429:
+            return THROTTLED
+        if status in (401, 407, 451):
+            return BLOCKED
+        if status in (403, 408, 500, 502, 503, 504):
+            return TRANSIENT  # 403 is mostly an expired format URL; the retry extracts afresh
+        if status:
+            return PERMANENT
+        names = {cls.__name__ for cls in type(exc).__mro__}
+        if names & BLOCKED_TYPES:
+            return BLOCKED
+        if names & TRANSIENT_TYPES or getattr(exc, 'errno', None) in TRANSIENT_ERRNOS:
+            return TRANSIENT
+    text = ' '.join(str(exc) for exc in _chain(error))
+    for kind, pattern in MESSAGE_PATTERNS:
+        if pattern.search(text):
+            return kind
+    return PERMANENT
+
+def retry_after(error):
+    """ Seconds from an HTTP Retry-After header anywhere in the chain, or None. """
+    for exc in _chain(error):
+        headers = getattr(exc, 'headers', None) or getattr(getattr(exc, 'response', None), 'headers', None)
+        value = headers.get('Retry-After') if headers is not None else None
+        if value and str(value).strip().isdigit():
+            return float(value)
+    return None
+
+def error_message(error):
+    """ The message to show for a failure, without yt-dlp's 'ERROR: [extractor] id:' prefix. """
+    return MESSAGE_PREFIX.sub('', str(error).strip()) or type(error).__name__
+
+def _chain(error):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        exc_info = getattr(error, 'exc_info', None)
+        wrapped = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        error = wrapped or error.__cause__ or error.__context__
+
+def _http_status(exc):
+    for attr in ('status', 'code'):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int) and 400 <= value < 600:
+            return value
+    return None
+
+class RetryPolicy:
+    """ How long to wait before retrying a failed job, if at all.
+
+    Delays use "full jitter": a uniform draw below an exponentially growing
+    cap, so jobs that failed together (a dropped connection) do not all come
+    back at the same moment. A server's Retry-After is honoured as a minimum.
+    """
+    def __init__(self, transient_retries=TRANSIENT_RETRIES, throttled_retries=THROTTLED_RETRIES,
+                 base=BACKOFF_BASE, throttled_base=THROTTLED_BACKOFF_BASE, max_delay=BACKOFF_MAX):
+        self.budgets = {TRANSIENT: transient_retries, THROTTLED: throttled_retries}
+        self.bases = {TRANSIENT: base, THROTTLED: throttled_base}
+        self.max_delay = max_delay
+
+    def delay(self, kind, attempt, minimum=None):
+        """ Seconds to wait before retry number ``attempt`` (1-based), or None to give up. """
+        if attempt > self.budgets.get(kind, 0):
+            return None
+        cap = min(self.bases[kind] * 2 ** (attempt - 1), self.max_delay)
+        return max(random.uniform(0, cap), minimum or 0)
+
+class _Host:
+    __slots__ = ('failures', 'open_until', 'probing')
+
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+
+class CircuitBreaker:
+    """ Stops scheduling jobs for a host that keeps failing.
+
+    After ``threshold`` consecutive TRANSIENT failures, or one THROTTLED
+    failure, the host is open (skipped by the scheduler) for a cooldown.
+    When it ends a single job is let through as a probe: success closes the
+    circuit, another failure opens it again for twice as long. Not
+    thread-safe; DownloadManager calls it under its own lock.
+    """
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN,
+                 max_cooldown=BREAKER_MAX_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._hosts = {}  # host -> _Host, only for hosts with recent failures
+
+    def blocked_until(self, host, now):
+        """ 0 if a job for ``host`` may start now, else when to look again (inf while a probe runs). """
+        state = self._hosts.get(host)
+        if state is None or state.failures < self.threshold:
+            return 0
+        if now < state.open_until:
+            return state.open_until
+        return float('inf') if state.probing else 0
+
+    def started(self, host):
+        """ A job for ``host`` was scheduled; past the cooldown it is the probe. """
+        state = self._hosts.get(host)
+        if state is not None and state.failures >= self.threshold:
+            state.probing = True
+
+    def finished(self, host):
+        """ A job for ``host`` ended, however it ended; the next probe may go. """
+        state = self._hosts.get(host)
+        if state is not None:
+            state.probing = False
+
+    def record(self, host, kind, now, retry_after=None):
+        """ Records a download's result (kind None for success). Returns True if the circuit just opened.
+
+        Kinds that say nothing about the host (BLOCKED, PERMANENT) are ignored.
+        """
+        if kind is None:
+            self._hosts.pop(host, None)
+            return False
+        if kind not in (TRANSIENT, THROTTLED):
+            return False
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _Host()
+        state.failures = max(state.failures + 1, self.threshold if kind == THROTTLED else 0)
+        if state.failures < self.threshold:
+            return False
+        cooldown = min(self.cooldown * 2 ** (state.failures - self.threshold), self.max_cooldown)
+        state.open_until = now + max(cooldown, retry_after or 0)
+        return True
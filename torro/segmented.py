@@ -0,0 +1,148 @@
+import errno
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+
+CHUNK_SIZE = 256 * 1024
+MIN_SEGMENT_SIZE = 1024 * 1024   # Smaller files are not worth extra connections
+TIMEOUT = 30                     # seconds per socket operation
+
+class SegmentedUnsupported(Exception):
+    """ The server cannot serve byte ranges for this URL; use a single stream instead. """
+
+class SegmentedDownload:
+    """ Downloads one HTTP resource over several parallel byte-range requests.
+
+    The ``.segments.part`` file is preallocated to the full size and every
+    segment writes its bytes straight to their final offset with
+    ``os.pwrite``, so nothing has to be reassembled afterwards. Progress is reported through
+    ``progress_hook`` with the same dict shape yt-dlp uses ('downloading'
+    with downloaded_bytes/total_bytes/speed, then 'finished'), so the
+    caller's yt-dlp hook can be reused as is. An exception raised by the
+    hook (e.g. yt-dlp's DownloadCancelled) stops every segment and is
+    re-raised from ``run()``. ``headers`` must be everything yt-dlp would
+    send, cookies included, or signed URLs answer with 403.
+    """
+    def __init__(self, url, filename, segments=4, headers=None, progress_hook=None):
+        self.url = url
+        self.filename = filename
+        self.segments = max(1, segments)
+        self.headers = dict(headers or {})
+        self.progress_hook = progress_hook
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error = None
+        self._downloaded = 0
+        self._total = 0
+        self._started = 0.0
+
+    def _open(self, first, last=None):
+        headers = dict(self.headers, Range=f"bytes={first}-{'' if last is None else last}")
+        try:
+            return urllib.request.urlopen(urllib.request.Request(self.url, headers=headers), timeout=TIMEOUT)
+        except urllib.error.HTTPError as e:
+            # 416, 403 for a range request, and so on: yt-dlp's own downloader
+            # retries it the usual way and reports any real error properly
+            e.close()
+            raise SegmentedUnsupported(f"{self.url}: HTTP {e.code}") from e
+
+    def probe(self):
+        """ Returns the resource size, or raises SegmentedUnsupported. """
+        with self._open(0, 0) as response:
+            match = re.match(r'bytes 0-0/(\d+)', response.headers.get('Content-Range', ''))
+            if response.status != 206 or not match or int(match.group(1)) == 0:
+                raise SegmentedUnsupported(self.url)
+            return int(match.group(1))
+
+    def ranges(self, size):
+        """ Splits ``size`` bytes into at most ``self.segments`` inclusive ranges. """
+        count = max(1, min(self.segments, size // MIN_SEGMENT_SIZE))
+        step = -(-size // count)  # ceil division
+        return [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+
+    def run(self):
+        size = self.probe()
+        self._total = size
+        self._started = time.monotonic()
+        # Not '.part': a preallocated file is full-size from the start, and
+        # yt-dlp's continuedl would mistake it for a finished download.
+        part = self.filename + '.segments.part'
+
+        fd = os.open(part, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            try:
+                self._preallocate(fd, size)
+                threads = [threading.Thread(target=self._fetch_range, args=(fd, first, last), daemon=True)
+                           for first, last in self.ranges(size)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                os.close(fd)
+            if self._error is not None:
+                raise self._error
+        except BaseException:
+            # Full-size from the start and never continued (the next run truncates
+            # it), so keeping it would only hold the space of a second copy
+            os.remove(part)
+            raise
+        os.replace(part, self.filename)
+        self._report('finished')
+        return self.filename
+
+    @staticmethod
+    def _preallocate(fd, size):
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                # Reserve the blocks up front: fails fast on a full disk, less fragmentation
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+                    raise
+        os.ftruncate(fd, size)
+
+    def _fetch_range(self, fd, first, last):
+        position = first
+        try:
+            with self._open(first, last) as response:
+                if response.status != 206:
+                    raise SegmentedUnsupported(self.url)
+                while position <= last and not self._stop.is_set():
+                    chunk = response.read(min(CHUNK_SIZE, last - position + 1))
+                    if not chunk:
+                        raise IOError(f"Connection closed at byte {position} of range {first}-{last}")
+                    view = memoryview(chunk)
+                    while view:
+                        written = os.pwrite(fd, view, position)
+                        view = view[written:]
+                        position += written
+                    self._advance(len(chunk))
+        except BaseException as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+            self._stop.set()
+
+    def _advance(self, count):
+        with self._lock:
+            self._downloaded += count
+            self._report('downloading')
+
+    def _report(self, status):
+        """ Calls the progress hook. Segments call it under self._lock, one at a time. """
+        if self.progress_hook is None:
+            return
+        elapsed = time.monotonic() - self._started
+        self.progress_hook({
+            'status': status,
+            'filename': self.filename,
+            'downloaded_bytes': self._downloaded,
+            'total_bytes': self._total,
+            'elapsed': elapsed,
+            'speed': self._downloaded / elapsed if elapsed > 0 else None,
+        })
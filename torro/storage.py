@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+
+from torro.formats import STORAGE_RESERVE, free_space
+
+DOWNLOAD_DIR_NAME = 'Torro'            # Created inside the platform's Downloads directory
+FALLBACK_DOWNLOAD_FOLDER = 'Torro_Downloads'  # Relative to the working directory, as a last resort
+STORAGE_QUOTA = None                   # Bytes of finished downloads to keep; None for no limit
+STORAGE_MAX_AGE = None                 # Seconds a download is kept since it was last used; None for ever
+MERGE_SPACE_FACTOR = 2                 # Streams and merged output coexist until the merge is done
+
+class InsufficientStorage(Exception):
+    """ A job does not fit in the free space of the download volume. """
+
+def download_directories():
+    """ Candidate download folders, best first.
+
+    On Android: Download/Torro in shared storage (what the user sees in
+    the Files app), then the app's own external files directory, which
+    needs no storage permission. Elsewhere: the XDG or home Downloads
+    folder. The working directory comes last.
+    """
+    try:
+        from jnius import autoclass
+    except ImportError:
+        downloads = os.environ.get('XDG_DOWNLOAD_DIR') or os.path.join(os.path.expanduser('~'), 'Downloads')
+        yield os.path.join(downloads, DOWNLOAD_DIR_NAME)
+    else:
+        try:
+            environment = autoclass('android.os.Environment')
+            activity = autoclass('org.kivy.android.PythonActivity').mActivity
+            yield os.path.join(environment.getExternalStoragePublicDirectory(
+                environment.DIRECTORY_DOWNLOADS).getAbsolutePath(), DOWNLOAD_DIR_NAME)
+            app_dir = activity.getExternalFilesDir(environment.DIRECTORY_DOWNLOADS)
+            if app_dir is not None:
+                yield app_dir.getAbsolutePath()
+        except Exception as e:
+            print(f"Cannot query the Android storage directories: {e}")
+    yield FALLBACK_DOWNLOAD_FOLDER
+
+class Storage:
+    """ The download folder and the space in it.
+
+    ``root`` defaults to the first usable folder from download_directories().
+    Everything a job writes (.part files, streams, merge output) goes
+    there directly, so finishing a download never copies across volumes.
+
+    Before a job starts it ``reserve()``s its expected size: the job is
+    refused if that, plus the other jobs' reservations and STORAGE_RESERVE,
+    is more than the volume has free. If ``quota`` (bytes) is set, finished
+    downloads in ``library`` are deleted least recently used first to make
+    room; with ``max_age`` (seconds), ones unused for longer are deleted
+    anyway. Only files in the library are ever deleted.
+    """
+    def __init__(self, root=None, library=None, quota=STORAGE_QUOTA, max_age=STORAGE_MAX_AGE,
+                 reserve=STORAGE_RESERVE, metrics=None):
+        self.root = self._usable_root([root] if root else download_directories())
+        self.library = library
+        self.quota = quota
+        self.max_age = max_age
+        self.reserve_bytes = reserve
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._reserved = {}  # job id -> bytes set aside for it
+
+    @staticmethod
+    def _usable_root(candidates):
+        for path in candidates:
+            try:
+                os.makedirs(path, exist_ok=True)
+                if os.access(path, os.W_OK):
+                    return path
+            except OSError as e:
+                print(f"Cannot use {path} for downloads: {e}")
+        raise InsufficientStorage("No writable download folder")
+
+    def available(self):
+        """ Free bytes not yet promised to a running job, or None if unknown. """
+        free = free_space(self.root)
+        if free is None:
+            return None
+        with self._lock:
+            return free - sum(self._reserved.values())
+
+    def reserve(self, job_id, size):
+        """ Sets ``size`` bytes aside for a job, cleaning up first if the quota requires it.
+
+        Raises InsufficientStorage if it does not fit. An unknown size
+        (None) is always accepted.
+        """
+        self.cleanup(incoming=size or 0)
+        if not size:
+            return
+        with self._lock:
+            free = free_space(self.root)
+            if free is not None:
+                free -= sum(self._reserved.values()) + self.reserve_bytes
+                if size > free:
+                    raise InsufficientStorage(f"Not enough space, {size / 1024 / 1024:.0f} MB needed "
+                                              f"and {max(free, 0) / 1024 / 1024:.0f} MB free")
+            self._reserved[job_id] = size
+
+    def release(self, job_id):
+        with self._lock:
+            self._reserved.pop(job_id, None)
+
+    # --- Cleanup ---
+    def cleanup(self, incoming=0):
+        """ Applies the age limit and the quota (leaving room for ``incoming`` bytes). Returns the bytes freed. """
+        if not self.library or (self.quota is None and self.max_age is None):
+            return 0
+        if self.quota is not None and incoming > self.quota:
+            incoming = 0  # Emptying the library could not make room for it anyway
+        with self._lock:
+            entries = sorted(self.library.entries(), key=_last_used)
+            usage = sum(entry['size'] for entry in entries)
+            now = time.time()
+            freed = 0
+            for entry in entries:
+                expired = self.max_age is not None and now - _last_used(entry) > self.max_age
+                over_quota = self.quota is not None and usage - freed + incoming > self.quota
+                if not (expired or over_quota):
+                    break  # Oldest first: nothing later is expired or over quota either
+                if self._delete(entry):
+                    freed += entry['size']
+        if freed and self.metrics:
+            self.metrics.inc('storage_freed_bytes', freed)
+        return freed
+
+    def _delete(self, entry):
+        try:
+            os.remove(entry['path'])
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Cannot remove {entry['path']}: {e}")
+            return False
+        self.library.remove(entry['video_key'])
+        print(f"Removed {os.path.basename(entry['path'])} to stay within the storage limits")
+        return True
+
+def _last_used(entry):
+    """ When a file was last played or written; atime is only as fresh as the mount allows. """
+    try:
+        stat = os.stat(entry['path'])
+        return max(stat.st_atime, stat.st_mtime)
+    except OSError:
+        return entry['created_at']
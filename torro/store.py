@@ -0,0 +1,209 @@
+from bisect import bisect_left
+
+# --- Statuses ---
+ACTIVE_STATUSES = ('downloading', 'processing', 'queued', 'paused', 'error')  # Listed under "Active Downloads"
+RESUMABLE_STATUSES = ('downloading', 'processing', 'queued', 'paused')        # Reloaded after a restart
+TRANSIENT_FIELDS = {'progress', 'speed'}  # Updated every tick, not written to disk
+
+HISTORY_PAGE_SIZE = 50  # Rows paged in from the database at a time
+VIEW_FIELDS = ('id', 'title', 'status', 'progress', 'thumbnail', 'speed')  # What a card shows
+
+def apply_row(view, row):
+    """ Copies ``row``'s VIEW_FIELDS onto ``view``, skipping the ones it already shows.
+
+    ``view`` remembers the row and version it last applied: the same row at
+    the same version costs nothing, and one update later only that update's
+    fields are set. Anything else (a recycled card) compares every field
+    and sets the ones that differ, since neighbouring rows often share a
+    status, speed or progress. Returns how many fields were set.
+    """
+    fields = row.changed_since(view.row_version) if view.row is row else None
+    count = 0
+    if fields is None:
+        for key in VIEW_FIELDS:
+            value = getattr(row, key)
+            if getattr(view, key) != value:
+                setattr(view, key, value)
+                count += 1
+    else:
+        for key in fields:
+            if key in VIEW_FIELDS:
+                setattr(view, key, getattr(row, key))
+                count += 1
+    view.row = row
+    view.row_version = row.version
+    return count
+
+class DownloadStore:
+    """ Rows (torro.history.Row) of the jobs that are still active, written through to the history database.
+
+    Finished rows are dropped from memory once their final status is stored;
+    a UI pages them back in through HistoryView. Listeners
+    registered with bind() are called as ``callback(event, row)`` with event
+    'insert' or 'update', or 'stored' for a change to a row that has left
+    memory, where ``row`` is a dict of its id and the changed fields.
+    """
+    def __init__(self, history):
+        self.history = history
+        self._rows = {}   # download id -> Row, active jobs only
+        self._listeners = []
+
+    def __len__(self):
+        return len(self._rows)
+
+    def bind(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, event, row):
+        for callback in self._listeners:
+            callback(event, row)
+
+    def load_resident(self):
+        """ Brings back jobs left unfinished by the last session.
+
+        Jobs the user paused stay paused; jobs that were interrupted come
+        back as 'queued' so they can be resubmitted.
+        """
+        rows = self.history.with_status(RESUMABLE_STATUSES)
+        for row in reversed(rows):  # oldest first, so views see ascending ids
+            if row['status'] != 'paused':
+                row.update(status='queued', speed='')
+                self.history.update(row['id'], status='queued', speed='')
+            self._rows[row['id']] = row
+            self._notify('insert', row)
+        return rows
+
+    def add(self, row):
+        """ Stores a new row; its id is assigned by the history database. """
+        row['id'] = self.history.insert(row)
+        self._rows[row['id']] = row
+        self._notify('insert', row)
+        return row
+
+    def get(self, download_id):
+        return self._rows.get(download_id)
+
+    def rows(self):
+        """ The resident rows, in no particular order. """
+        return list(self._rows.values())
+
+    def update(self, download_id, **fields):
+        """ Updates a row in place. Returns the row, or None if it is not resident. """
+        row = self._rows.get(download_id)
+        if row is None:
+            return None
+        row.update(fields)
+        # Progress ticks stay in memory; anything else is persisted right away.
+        if not TRANSIENT_FIELDS.issuperset(fields):
+            self.history.update(download_id, **row)
+        self._notify('update', row)
+        if row['status'] not in ACTIVE_STATUSES:
+            del self._rows[download_id]
+        return row
+
+    def update_stored(self, download_id, **fields):
+        """ Updates a finished row in the database, e.g. a thumbnail that arrived late. """
+        self.history.update(download_id, **fields)
+        self._notify('stored', dict(fields, id=download_id))
+
+class RowsView:
+    """ Newest-first list of rows with row-level change notifications.
+
+    Row ids are increasing integers, so positions are found by bisection
+    instead of a scan. Listeners get ``callback(event, index, rows)`` with
+    event 'insert', 'remove' or 'update', where ``rows`` are the affected
+    rows starting at ``index``.
+    """
+    def __init__(self):
+        self.rows = []
+        self._keys = []  # negated ids, ascending == newest first
+        self._listeners = []
+
+    def bind(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, event, index, rows):
+        for callback in self._listeners:
+            callback(event, index, rows)
+
+    def index_of(self, download_id):
+        key = -int(download_id)
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return index
+        return -1
+
+    def _insert(self, row):
+        key = -int(row['id'])
+        index = bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        self.rows.insert(index, row)
+        self._notify('insert', index, [row])
+
+    def _remove(self, index):
+        del self._keys[index]
+        row = self.rows.pop(index)
+        self._notify('remove', index, [row])
+
+class ActiveDownloadsView(RowsView):
+    """ Resident rows whose status is active, kept up to date from store notifications. """
+    def __init__(self, store, statuses=ACTIVE_STATUSES):
+        super().__init__()
+        self.statuses = statuses
+        store.bind(self._on_store_change)
+
+    def _on_store_change(self, event, row):
+        if event == 'stored':
+            return  # Finished rows are never active
+        index = self.index_of(row['id'])
+        active = row['status'] in self.statuses
+        if active and index == -1:
+            self._insert(row)
+        elif index != -1 and not active:
+            self._remove(index)
+        elif index != -1:
+            self._notify('update', index, [row])
+
+class HistoryView(RowsView):
+    """ Newest-first window over the full history, paged in from the database on demand. """
+    def __init__(self, store, page_size=HISTORY_PAGE_SIZE):
+        super().__init__()
+        self.store = store
+        self.page_size = page_size
+        self.loaded = False
+        self.exhausted = False
+        store.bind(self._on_store_change)
+
+    def load_more(self):
+        """ Appends the next page of older rows. Returns how many were added. """
+        if self.exhausted:
+            return 0
+        before_id = self.rows[-1]['id'] if self.rows else None
+        page = self.store.history.page(before_id, self.page_size)
+        self.loaded = True
+        self.exhausted = len(page) < self.page_size
+        # Resident jobs are shown through their live row, not the stored copy
+        page = [self.store.get(row['id']) or row for row in page]
+        if page:
+            index = len(self.rows)
+            self.rows.extend(page)
+            self._keys.extend(-int(row['id']) for row in page)
+            self._notify('insert', index, page)
+        return len(page)
+
+    def _on_store_change(self, event, row):
+        if not self.loaded:
+            return  # The first page will pick the row up from the database
+        if event == 'insert':
+            self._insert(row)
+            return
+        index = self.index_of(row['id'])
+        if index == -1:
+            return
+        if event == 'stored':
+            # Only the paged-in copy knows about it; bumping its version redraws the card
+            fields = dict(row)
+            del fields['id']
+            row = self.rows[index]
+            row.update(fields)
+        self._notify('update', index, [row])
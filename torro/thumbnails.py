@@ -0,0 +1,102 @@
+import hashlib
+import io
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+FETCH_TIMEOUT = 15        # seconds
+MAX_SOURCE_BYTES = 8 * 1024 * 1024
+JPEG_QUALITY = 85
+
+class ThumbnailCache:
+    """ Downloads each thumbnail once and keeps a card-sized copy on disk.
+
+    Images are downscaled (center-cropped to fill) to ``size`` pixels and
+    stored under the SHA-256 of the resulting JPEG, so identical thumbnails
+    reached through different URLs share one file. A small per-URL key file
+    points at that digest, which makes "do we have it?" a single stat.
+    Fetches run on their own small thread pool; callbacks are invoked on
+    that pool with the local path, or None if the image could not be fetched.
+    """
+    def __init__(self, cache_dir, size, workers=2):
+        self.cache_dir = cache_dir
+        self.size = size
+        self._index_dir = os.path.join(cache_dir, 'by-url')
+        os.makedirs(self._index_dir, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='torro-thumb')
+        self._lock = threading.Lock()
+        self._in_flight = {}  # url -> callbacks waiting for it
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+    def _key_path(self, url):
+        return os.path.join(self._index_dir, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def _content_path(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], digest + '.jpg')
+
+    def lookup(self, url):
+        """ Local path of an already cached thumbnail, or None. Never touches the network. """
+        try:
+            with open(self._key_path(url), encoding='ascii') as f:
+                path = self._content_path(f.read().strip())
+        except OSError:
+            return None
+        return path if os.path.exists(path) else None
+
+    def fetch(self, url, callback):
+        """ Calls ``callback(path)`` once ``url`` is cached, fetching it only if needed. """
+        if not url:
+            callback(None)
+            return
+        with self._lock:
+            if url in self._in_flight:
+                self._in_flight[url].append(callback)
+                return
+            self._in_flight[url] = [callback]
+        self._pool.submit(self._fetch, url)
+
+    def _fetch(self, url):
+        try:
+            path = self.lookup(url) or self._download(url)
+        except Exception as e:
+            print(f"Thumbnail fetch failed for {url}: {e}")
+            path = None
+        with self._lock:
+            callbacks = self._in_flight.pop(url, [])
+        for callback in callbacks:
+            callback(path)
+
+    def _download(self, url):
+        request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+        with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(MAX_SOURCE_BYTES)
+        data = self._downscale(data)
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._content_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_atomic(path, data)
+        self._write_atomic(self._key_path(url), digest.encode('ascii'))
+        return path
+
+    def _downscale(self, data):
+        with Image.open(io.BytesIO(data)) as image:
+            # draft() lets JPEG decode at a reduced scale instead of full size
+            image.draft('RGB', self.size)
+            image = ImageOps.fit(image.convert('RGB'), self.size, Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        return out.getvalue()
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)